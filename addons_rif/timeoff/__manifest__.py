@@ -1,7 +1,7 @@
 {
     "name": "TimeOff",
     "summary": "Gestion des congés des employés",
-    "version": "18.0.1.0.0",
+    "version": "18.0.1.1.0",
     "license": "LGPL-3",
     "category": "Human Resources",
     "author": "Ton Nom ou Groupe",
@@ -9,10 +9,23 @@
     "depends": ["base","hr","hr_holidays","mail","portal","calendar","board","web"],
     "data": [
         'security/ir.model.access.csv',
+        'data/hr_leave_quota_policy_data.xml',
+        'data/ir_config_parameter_data.xml',
+        'data/ir_cron_data.xml',
         'views/leave_refuse_wizard_views.xml',
         'views/hr_leave_views.xml',
         'views/hr_leave_allocation_mass_wizard_views.xml',
         'views/hr_leave_allocation_mass_menu.xml',
+        'views/hr_leave_usage_summary_views.xml',
+        'views/hr_leave_quota_policy_views.xml',
+        'views/hr_leave_notification_outbox_views.xml',
+        'views/timeoff_perf_stat_views.xml',
+        'views/hr_leave_allocation_mass_job_views.xml',
+        'views/hr_leave_allocation_rule_views.xml',
+        'views/hr_leave_allocation_rollover_views.xml',
+        'views/hr_department_views.xml',
+        'views/hr_leave_import_wizard_views.xml',
+        'views/hr_leave_archive_views.xml',
         
         ],
     
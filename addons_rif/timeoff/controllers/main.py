@@ -0,0 +1,190 @@
+import csv
+import hashlib
+import io
+import tempfile
+
+from werkzeug.exceptions import BadRequest, Forbidden
+
+from odoo import fields, http
+from odoo.http import content_disposition, request
+from odoo.osv import expression
+from odoo.tools.misc import xlsxwriter
+
+# Lignes lues à chaque aller-retour du curseur serveur
+EXPORT_FETCH_SIZE = 2000
+# Taille des blocs envoyés au client pour le format XLSX
+EXPORT_STREAM_BLOCK = 64 * 1024
+# Lignes de données par feuille XLSX (limite du format : 1 048 576 lignes, en-tête compris)
+XLSX_SHEET_ROWS = 1048575
+
+EXPORT_HEADER = [
+    'ID', 'Employé', 'Matricule', 'Département', 'Type de congé', 'État',
+    'Du', 'Au', 'Jours', 'Jours par année', 'Raison du refus',
+    'Premier approbateur', 'Second approbateur',
+]
+
+
+class TimeoffController(http.Controller):
+
+    @http.route('/timeoff/balances', type='http', auth='user', methods=['GET'])
+    def leave_balances(self, employee_ids=None, department_id=None, **kw):
+        """Soldes de congés d'une liste d'employés (identifiants séparés par des
+        virgules) ou d'un département, pour les tableaux de bord d'équipe.
+
+        La réponse porte un ETag dérivé des dernières modifications des congés et
+        allocations concernés : si le client le renvoie dans If-None-Match et que
+        rien n'a changé, la réponse est un 304 sans recalcul des soldes.
+        """
+        try:
+            ids = [int(value) for value in employee_ids.split(',')] if employee_ids else []
+            department_id = int(department_id) if department_id else False
+        except ValueError:
+            raise BadRequest()
+        if not ids and not department_id:
+            raise BadRequest()
+
+        domain = [('id', 'in', ids)] if ids else [('department_id', '=', department_id)]
+        domain = expression.AND([domain, [('company_id', 'in', request.env.companies.ids)]])
+        if not request.env.user.has_group('hr_holidays.group_hr_holidays_user'):
+            # Hors gestionnaires de congés : soi-même et son équipe uniquement
+            own_employees = request.env.user.employee_ids
+            domain = expression.AND([domain, [
+                '|', ('id', 'in', own_employees.ids), ('parent_id', 'child_of', own_employees.ids),
+            ]])
+        employees = request.env['hr.employee'].sudo().search(domain, order='id')
+
+        version = employees._get_timeoff_balances_version()
+        etag = hashlib.sha1(
+            f'{employees.ids}|{request.env.lang}|{fields.Date.today()}|{version}'.encode()
+        ).hexdigest()
+        headers = [('ETag', f'"{etag}"'), ('Cache-Control', 'private, no-cache')]
+        if request.httprequest.if_none_match.contains(etag):
+            return request.make_response('', headers=headers, status=304)
+
+        balances = employees._get_timeoff_balances()
+        return request.make_json_response({
+            'employees': [{
+                'id': employee.id,
+                'name': employee.name,
+                'balances': balances[employee.id],
+            } for employee in employees],
+        }, headers=headers)
+
+    @http.route('/timeoff/export/leaves', type='http', auth='user', methods=['GET'])
+    def export_leaves(self, date_from, date_to, department_ids=None, leave_type_ids=None, file_format='csv', **kw):
+        """Exporter l'historique des congés pour la paie, en flux.
+
+        Les lignes sont lues par un curseur serveur nommé dans un curseur dédié, et
+        écrites dans la réponse au fur et à mesure : la mémoire reste bornée quel que
+        soit le nombre de congés. Filtres : période (AAAA-MM-JJ), départements et
+        types de congé (identifiants séparés par des virgules).
+        """
+        if not request.env.user.has_group('hr_holidays.group_hr_holidays_user'):
+            raise Forbidden()
+        try:
+            params = {
+                'date_from': fields.Date.to_date(date_from),
+                'date_to': fields.Date.to_date(date_to),
+                'department_ids': [int(value) for value in department_ids.split(',')] if department_ids else None,
+                'leave_type_ids': [int(value) for value in leave_type_ids.split(',')] if leave_type_ids else None,
+                'company_ids': request.env.companies.ids,
+                'lang': request.env.lang or 'en_US',
+            }
+        except ValueError:
+            raise BadRequest()
+        if not params['date_from'] or not params['date_to'] or file_format not in ('csv', 'xlsx'):
+            raise BadRequest()
+
+        filename = f'conges_{date_from}_{date_to}.{file_format}'
+        registry = request.env.registry
+        if file_format == 'xlsx':
+            rows = self._stream_xlsx(registry, params)
+            content_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        else:
+            rows = self._stream_csv(registry, params)
+            content_type = 'text/csv; charset=utf-8'
+        return request.make_response(rows, headers=[
+            ('Content-Type', content_type),
+            ('Content-Disposition', content_disposition(filename)),
+        ])
+
+    def _iter_rows(self, registry, params):
+        """Lire les congés, courants et archivés, via un curseur serveur nommé, dans un
+        curseur dédié : la réponse est générée après la fin de la requête HTTP et de
+        son curseur."""
+        with registry.cursor() as cr:
+            with cr._cnx.cursor('timeoff_leave_export') as named_cursor:
+                named_cursor.itersize = EXPORT_FETCH_SIZE
+                named_cursor.execute("""
+                    SELECT l.id, e.name, e.identification_id, d.complete_name,
+                           COALESCE(t.name->>%(lang)s, t.name->>'en_US'), l.state,
+                           l.request_date_from, l.request_date_to, l.number_of_days,
+                           (SELECT string_agg(
+                                       y.year || ':' || ROUND((l.number_of_days
+                                           * ((LEAST(l.request_date_to, make_date(y.year, 12, 31))
+                                               - GREATEST(l.request_date_from, make_date(y.year, 1, 1)) + 1)::numeric
+                                              / (l.request_date_to - l.request_date_from + 1)))::numeric, 2),
+                                       ' ; ' ORDER BY y.year)
+                              FROM generate_series(EXTRACT(YEAR FROM l.request_date_from)::int,
+                                                   EXTRACT(YEAR FROM l.request_date_to)::int) AS y(year)),
+                           l.refuse_reason, first_approver.name, second_approver.name
+                      FROM (
+                           SELECT id, employee_id, holiday_status_id, state, request_date_from, request_date_to,
+                                  number_of_days, refuse_reason, first_approver_id, second_approver_id
+                             FROM hr_leave
+                            UNION ALL
+                           SELECT id, employee_id, holiday_status_id, state, request_date_from, request_date_to,
+                                  number_of_days, refuse_reason, first_approver_id, second_approver_id
+                             FROM hr_leave_archive
+                      ) AS l
+                      JOIN hr_employee e ON e.id = l.employee_id
+                      JOIN hr_leave_type t ON t.id = l.holiday_status_id
+                 LEFT JOIN hr_department d ON d.id = e.department_id
+                 LEFT JOIN hr_employee first_approver ON first_approver.id = l.first_approver_id
+                 LEFT JOIN hr_employee second_approver ON second_approver.id = l.second_approver_id
+                     WHERE l.request_date_from <= %(date_to)s
+                       AND l.request_date_to >= %(date_from)s
+                       AND e.company_id = ANY(%(company_ids)s)
+                       AND (%(department_ids)s::int[] IS NULL OR e.department_id = ANY(%(department_ids)s::int[]))
+                       AND (%(leave_type_ids)s::int[] IS NULL OR l.holiday_status_id = ANY(%(leave_type_ids)s::int[]))
+                     ORDER BY l.request_date_from, l.id
+                """, params)
+                yield from named_cursor
+
+    def _stream_csv(self, registry, params):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_HEADER)
+        for count, row in enumerate(self._iter_rows(registry, params), start=1):
+            writer.writerow(row)
+            if count % EXPORT_FETCH_SIZE == 0:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue().encode()
+
+    def _stream_xlsx(self, registry, params):
+        """XLSX en mode constant_memory : chaque ligne est vidée sur disque dès
+        qu'elle est écrite, puis le fichier est renvoyé par blocs. Au-delà de la
+        limite de lignes du format, l'export continue sur une nouvelle feuille."""
+        with tempfile.TemporaryFile() as output:
+            workbook = xlsxwriter.Workbook(output, {'constant_memory': True, 'in_memory': False})
+            date_format = workbook.add_format({'num_format': 'yyyy-mm-dd'})
+            worksheet = None
+            for index, row in enumerate(self._iter_rows(registry, params)):
+                sheet_number, row_index = divmod(index, XLSX_SHEET_ROWS)
+                row_index += 1
+                if row_index == 1:
+                    worksheet = workbook.add_worksheet(f'Congés {sheet_number + 1}')
+                    worksheet.write_row(0, 0, EXPORT_HEADER)
+                for column_index, value in enumerate(row):
+                    if column_index in (6, 7) and value:
+                        worksheet.write_datetime(row_index, column_index, value, date_format)
+                    else:
+                        worksheet.write(row_index, column_index, value)
+            if worksheet is None:
+                workbook.add_worksheet('Congés 1').write_row(0, 0, EXPORT_HEADER)
+            workbook.close()
+            output.seek(0)
+            while block := output.read(EXPORT_STREAM_BLOCK):
+                yield block
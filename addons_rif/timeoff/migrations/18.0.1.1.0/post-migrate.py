@@ -0,0 +1,47 @@
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """Rattacher les allocations automatiques existantes à leur règle d'origine.
+
+    Ces allocations n'étaient reconnaissables qu'à leur description
+    'Auto-allocation - <type>' : une seule requête les associe à la règle active
+    du même type couvrant le département de l'employé, la plus ancienne en cas
+    d'ambiguïté, en respectant l'unicité (employé, type, règle).
+    """
+    if not version:
+        return
+    cr.execute("""
+        WITH candidates AS (
+            SELECT DISTINCT ON (a.id) a.id AS allocation_id, a.employee_id, a.holiday_status_id, r.id AS rule_id
+              FROM hr_leave_allocation a
+              JOIN hr_employee e ON e.id = a.employee_id
+              JOIN hr_leave_type t ON t.id = a.holiday_status_id
+              JOIN hr_leave_allocation_rule r ON r.holiday_status_id = a.holiday_status_id AND r.active
+              JOIN hr_department_hr_leave_allocation_rule_rel rel
+                ON rel.hr_leave_allocation_rule_id = r.id AND rel.hr_department_id = e.department_id
+             WHERE a.allocation_rule_id IS NULL
+               AND a.private_name IN (
+                       SELECT 'Auto-allocation - ' || names.value FROM jsonb_each_text(t.name) AS names
+                   )
+             ORDER BY a.id, r.id
+        ), deduplicated AS (
+            SELECT DISTINCT ON (c.employee_id, c.holiday_status_id, c.rule_id) c.allocation_id, c.rule_id
+              FROM candidates c
+             WHERE NOT EXISTS (
+                       SELECT 1
+                         FROM hr_leave_allocation linked
+                        WHERE linked.employee_id = c.employee_id
+                          AND linked.holiday_status_id = c.holiday_status_id
+                          AND linked.allocation_rule_id = c.rule_id
+                   )
+             ORDER BY c.employee_id, c.holiday_status_id, c.rule_id, c.allocation_id
+        )
+        UPDATE hr_leave_allocation a
+           SET allocation_rule_id = d.rule_id
+          FROM deduplicated d
+         WHERE a.id = d.allocation_id
+    """)
+    _logger.info("%d allocation(s) automatique(s) rattachée(s) à leur règle", cr.rowcount)
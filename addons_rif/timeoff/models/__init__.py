@@ -1,3 +1,13 @@
+from . import hr_department
 from . import hr_leave
 from . import hr_leave_allocation_rule
-from . import hr_employee
\ No newline at end of file
+from . import hr_employee
+from . import hr_leave_usage_summary
+from . import hr_leave_quota_policy
+from . import hr_leave_notification_outbox
+from . import timeoff_perf_stat
+from . import hr_leave_allocation
+from . import hr_leave_allocation_mass_job
+from . import hr_leave_allocation_rollover
+from . import hr_leave_import
+from . import hr_leave_archive
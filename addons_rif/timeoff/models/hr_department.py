@@ -0,0 +1,105 @@
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import timedelta
+
+from odoo import api, fields, models
+
+
+def _merge_intervals(intervals):
+    """Fusionner les périodes [début, fin] d'un employé qui se chevauchent ou se suivent."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + timedelta(days=1):
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def _sweep(intervals_by_employee):
+    """Balayage des débuts et fins d'absence : segments [début, fin] triés et disjoints
+    avec le nombre d'employés absents simultanément, sans énumérer les jours."""
+    events = defaultdict(int)
+    for intervals in intervals_by_employee.values():
+        for start, end in _merge_intervals(intervals):
+            events[start] += 1
+            events[end + timedelta(days=1)] -= 1
+    segments = []
+    count = 0
+    previous_day = None
+    for day in sorted(events):
+        if count:
+            segments.append((previous_day, day - timedelta(days=1), count))
+        count += events[day]
+        previous_day = day
+    return segments
+
+
+class HrDepartment(models.Model):
+    _inherit = 'hr.department'
+
+    max_absence_rate = fields.Float(
+        string="Taux d'absence maximal (%)",
+        help="Part maximale des employés du département absents le même jour. 0 : pas de limite.")
+
+    def _get_absence_segments(self, date_from, date_to, extra_leave_ids=()):
+        """Absences simultanées par jour des départements de self sur une période.
+
+        Les congés validés et ceux en attente de seconde approbation (validate1) qui
+        chevauchent la période sont lus en une requête, ainsi que les congés de
+        extra_leave_ids (le lot en cours de validation) quel que soit leur état.
+
+        :return: dict {department_id: [(début, fin, nombre d'absents), ...]}
+        """
+        self.env['hr.leave'].flush_model(['employee_id', 'state', 'request_date_from', 'request_date_to'])
+        self.env['hr.employee'].flush_model(['department_id', 'active'])
+        self.env.cr.execute("""
+            SELECT e.department_id, l.employee_id, l.request_date_from, l.request_date_to
+              FROM hr_leave l
+              JOIN hr_employee e ON e.id = l.employee_id
+             WHERE e.department_id = ANY(%(department_ids)s)
+               AND e.active
+               AND (l.state IN %(counted_states)s OR l.id = ANY(%(extra_leave_ids)s))
+               AND l.request_date_from <= %(date_to)s
+               AND l.request_date_to >= %(date_from)s
+        """, {
+            'counted_states': ('validate1', 'validate'),
+            'extra_leave_ids': list(extra_leave_ids),
+            'department_ids': self.ids,
+            'date_from': date_from,
+            'date_to': date_to,
+        })
+        intervals = defaultdict(lambda: defaultdict(list))
+        for department_id, employee_id, start, end in self.env.cr.fetchall():
+            intervals[department_id][employee_id].append((start, end))
+        return {department.id: _sweep(intervals[department.id]) for department in self}
+
+    @api.model
+    def _get_absence_peak(self, segments, segment_ends, date_from, date_to):
+        """Pic d'absences simultanées sur [date_from, date_to] et premier jour où il est atteint.
+
+        segment_ends : fins des segments, pour sauter par dichotomie au premier segment utile.
+        """
+        peak, peak_day = 0, None
+        for start, end, count in segments[bisect_left(segment_ends, date_from):]:
+            if start > date_to:
+                break
+            if count > peak:
+                peak, peak_day = count, max(start, date_from)
+        return peak, peak_day
+
+    def _get_headcounts(self):
+        """Nombre d'employés actifs par département, en une requête groupée.
+
+        Lu en SQL comme _get_absence_segments : effectif et absents portent sur les
+        mêmes employés, sans règles d'accès ni filtre de sociétés de l'utilisateur.
+        """
+        self.env['hr.employee'].flush_model(['department_id', 'active'])
+        self.env.cr.execute("""
+            SELECT department_id, COUNT(*)
+              FROM hr_employee
+             WHERE department_id = ANY(%s)
+               AND active
+             GROUP BY department_id
+        """, (self.ids,))
+        return dict(self.env.cr.fetchall())
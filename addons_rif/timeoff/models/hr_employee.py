@@ -1,64 +1,134 @@
-from odoo import api, models
-import functools
-
-def avoid_duplicate_calls(func):
-    """Décorateur pour éviter les appels multiples de la même fonction"""
-    @functools.wraps(func)
-    def wrapper(self, *args, **kwargs):
-        cache_key = f"{func.__name__}{self.id}"
-
-        if hasattr(self.env, "_allocation_cache"):
-            if cache_key in self.env._allocation_cache:
-                return
-        else:
-            self.env._allocation_cache = set()
-
-        self.env._allocation_cache.add(cache_key)
-        result = func(self, *args, **kwargs)
-        self.env._allocation_cache.discard(cache_key)
-        return result
-    return wrapper
+from collections import defaultdict
 
+from odoo import api, fields, models
+from odoo.tools import date_utils
+from .timeoff_perf_stat import profiled
 
 
 class HrEmployee(models.Model):
     _inherit = 'hr.employee'
 
     @api.model_create_multi
+    @profiled
     def create(self, vals_list):
         employees = super().create(vals_list)
-        for employee in employees:
-            if employee.department_id:
-                employee._apply_allocation_rules()
+        employees._apply_allocation_rules_batch()
         return employees
 
+    @profiled
     def write(self, vals):
+        if 'department_id' not in vals:
+            return super().write(vals)
+
         old_departments = {emp.id: emp.department_id.id if emp.department_id else False for emp in self}
         result = super().write(vals)
-
-        if 'department_id' in vals:
-            for employee in self:
-                old_dept = old_departments.get(employee.id, False)
-                new_dept = employee.department_id.id
-                if old_dept != new_dept and new_dept:
-                    employee._apply_allocation_rules()
+        self.filtered(
+            lambda employee: employee.department_id and employee.department_id.id != old_departments.get(employee.id)
+        )._apply_allocation_rules_batch()
         return result
 
-    @avoid_duplicate_calls
     def _apply_allocation_rules(self):
         """Appliquer les règles d'allocation automatique à cet employé"""
-        if not self.department_id:
+        self._apply_allocation_rules_batch()
+
+    @profiled
+    def _apply_allocation_rules_batch(self):
+        """Appliquer les règles d'allocation automatique à tous les employés de self.
+
+        Les règles des départements sont lues dans le cache du registre,
+        les allocations existantes de toutes les paires (employé, type) en une requête
+        groupée, et seules les allocations manquantes sont insérées, une requête par règle.
+        """
+        employees = self.filtered('department_id')
+        if not employees:
+            return
+
+        Rule = self.env['hr.leave.allocation.rule']
+        rules_by_department = Rule._get_rules_by_department()
+        employee_rules = {
+            employee: rules_by_department.get(employee.department_id.id, ())
+            for employee in employees
+        }
+        type_ids = {type_id for rules in employee_rules.values() for rule_id, type_id, days in rules}
+        if not type_ids:
             return
 
-        rules = self.env['hr.leave.allocation.rule'].sudo().search([
-            ('active', '=', True),
-            ('department_ids', 'in', self.department_id.ids)
-        ])
-
-        for rule in rules:
-            exists = self.env['hr.leave.allocation'].search([
-                ('employee_id', '=', self.id),
-                ('holiday_status_id', '=', rule.holiday_status_id.id),
-            ], limit=1)
-            if not exists:
-                rule.sudo().apply_to_employee(self)
\ No newline at end of file
+        existing = {
+            (employee.id, leave_type.id)
+            for employee, leave_type in self.env['hr.leave.allocation'].sudo()._read_group([
+                ('employee_id', 'in', employees.ids),
+                ('holiday_status_id', 'in', list(type_ids)),
+            ], ['employee_id', 'holiday_status_id'])
+        }
+
+        employee_ids_by_rule = {}
+        for employee, rules in employee_rules.items():
+            for rule in rules:
+                key = (employee.id, rule[1])
+                if key in existing:
+                    continue
+                existing.add(key)
+                employee_ids_by_rule.setdefault(rule, []).append(employee.id)
+
+        for (rule_id, type_id, number_of_days), employee_ids in employee_ids_by_rule.items():
+            Rule._insert_auto_allocations(
+                rule_id, self.env['hr.leave.type'].browse(type_id), number_of_days, employee_ids
+            )
+
+    def _get_timeoff_balances_version(self):
+        """Empreinte des données dont dépendent les soldes de self, en une requête : plus
+        grande write_date et nombre de congés et d'allocations (le nombre détecte les
+        suppressions et archivages)."""
+        self.env['hr.leave'].flush_model()
+        self.env['hr.leave.allocation'].flush_model()
+        self.env.cr.execute("""
+            SELECT (SELECT ROW(MAX(write_date), COUNT(*))::text FROM hr_leave WHERE employee_id = ANY(%(ids)s)),
+                   (SELECT ROW(MAX(write_date), COUNT(*))::text FROM hr_leave_allocation WHERE employee_id = ANY(%(ids)s)),
+                   (SELECT MAX(write_date)::text FROM hr_leave_usage_summary WHERE employee_id = ANY(%(ids)s))
+        """, {'ids': self.ids})
+        return '|'.join(str(value) for value in self.env.cr.fetchone())
+
+    @profiled
+    def _get_timeoff_balances(self):
+        """Soldes de l'année par employé et type de congé, en trois requêtes groupées.
+
+        alloué : allocations validées en cours ; pris : registre hr.leave.usage.summary
+        de l'année ; en attente : demandes à valider de l'année ; restant : alloué - pris.
+
+        :return: dict {employee_id: [{'leave_type_id', 'leave_type', 'allocated', 'taken',
+                                      'pending', 'remaining'}, ...]}
+        """
+        today = fields.Date.today()
+        year_start, year_end = date_utils.start_of(today, 'year'), date_utils.end_of(today, 'year')
+        balances = defaultdict(lambda: defaultdict(float))
+        for employee, leave_type, days in self.env['hr.leave.allocation']._read_group([
+            ('employee_id', 'in', self.ids),
+            ('state', '=', 'validate'),
+            ('date_from', '<=', today),
+            '|', ('date_to', '=', False), ('date_to', '>=', today),
+        ], ['employee_id', 'holiday_status_id'], ['number_of_days:sum']):
+            balances[(employee.id, leave_type)]['allocated'] += days
+        for employee, leave_type, days in self.env['hr.leave.usage.summary']._read_group([
+            ('employee_id', 'in', self.ids),
+            ('year', '=', today.year),
+        ], ['employee_id', 'holiday_status_id'], ['number_of_days:sum']):
+            balances[(employee.id, leave_type)]['taken'] += days
+        for employee, leave_type, days in self.env['hr.leave']._read_group([
+            ('employee_id', 'in', self.ids),
+            ('state', '=', 'confirm'),
+            ('request_date_from', '<=', year_end),
+            ('request_date_to', '>=', year_start),
+        ], ['employee_id', 'holiday_status_id'], ['number_of_days:sum']):
+            balances[(employee.id, leave_type)]['pending'] += days
+
+        result = {employee.id: [] for employee in self}
+        for (employee_id, leave_type), values in sorted(balances.items(), key=lambda item: (item[0][0], item[0][1].id)):
+            result[employee_id].append({
+                'leave_type_id': leave_type.id,
+                'leave_type': leave_type.display_name,
+                'allocated': round(values['allocated'], 2),
+                'taken': round(values['taken'], 2),
+                'pending': round(values['pending'], 2),
+                'remaining': round(values['allocated'] - values['taken'], 2),
+            })
+        return result
@@ -1,12 +1,64 @@
 from odoo import api, models, fields, _
 from odoo.exceptions import UserError , ValidationError
-from datetime import datetime, date 
+from odoo.tools import create_index, float_compare, format_date, plaintext2html
+from .timeoff_perf_stat import profiled
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, date, timedelta
+from dateutil.relativedelta import relativedelta
+
+import pytz
+from pytz import timezone
+
+# États comptabilisés dans les quotas annuels
+QUOTA_STATES = ('validate', 'validate1')
+# Champs dont la modification change la contribution d'un congé au registre
+USAGE_SUMMARY_FIELDS = {
+    'state', 'employee_id', 'holiday_status_id', 'number_of_days',
+    'date_from', 'date_to', 'request_date_from', 'request_date_to',
+}
+
+# Types de congé dont la création n'est pas annoncée dans le chatter
+TYPES_SANS_EMAIL = [
+    'hr_holidays.holiday_status_cl',
+    'hr_holidays.holiday_status_sl',
+    'hr_holidays.holiday_status_unpaid',
+    'hr_holidays.holiday_status_comp',
+   # 'hr_holidays_attendance.holiday_status_extra_hours',
+    'hr_holidays.hr_holiday_status_dv',
+    'hr_holidays.holiday_status_training',
+]
+
+def split_days_by_year(date_from, date_to, number_of_days):
+    """Répartir number_of_days sur les années civiles de [date_from, date_to], au prorata
+    des jours calendaires couverts."""
+    if not date_from or not date_to:
+        return {}
+    if date_from.year == date_to.year:
+        return {date_from.year: number_of_days}
+
+    total_days = (date_to - date_from).days + 1
+    days_by_year = {}
+    for year in range(date_from.year, date_to.year + 1):
+        start = max(date_from, date(year, 1, 1))
+        end = min(date_to, date(year, 12, 31))
+        days_by_year[year] = number_of_days * ((end - start).days + 1) / total_days
+    return days_by_year
+
 
 class HrLeave(models.Model):
     _inherit = 'hr.leave'
 
     refuse_reason = fields.Text(string="Raison du refus")
-    
+
+    def init(self):
+        # Chemins d'accès des contrôles de quota, de chevauchement et du registre de
+        # consommation : employé, type, état puis période
+        create_index(self.env.cr, 'hr_leave_employee_type_state_idx', self._table,
+                     ['employee_id', 'holiday_status_id', 'state'])
+        create_index(self.env.cr, 'hr_leave_validated_employee_type_period_idx', self._table,
+                     ['employee_id', 'holiday_status_id', 'request_date_from', 'request_date_to'],
+                     where="state IN ('validate', 'validate1')")
 
     def _convert_to_date(self, date_value):
         """Convertir datetime en date si nécessaire"""
@@ -15,22 +67,125 @@ class HrLeave(models.Model):
         elif isinstance(date_value, date):
             return date_value
         return date_value
+
+    def _get_days_by_year(self):
+        """Répartir number_of_days par année civile, au prorata des jours calendaires
+        couverts par le congé (un congé du 30/12 au 02/01 compte sur les deux années)."""
+        self.ensure_one()
+        date_from = self.request_date_from or self._convert_to_date(self.date_from)
+        date_to = self.request_date_to or self._convert_to_date(self.date_to)
+        return split_days_by_year(date_from, date_to, self.number_of_days)
+
+    def _get_usage_by_key(self):
+        """Contribution de chaque congé validé au registre hr.leave.usage.summary."""
+        usage = defaultdict(float)
+        for leave in self:
+            if leave.state not in QUOTA_STATES or not leave.employee_id or not leave.holiday_status_id:
+                continue
+            for year, days in leave._get_days_by_year().items():
+                usage[(leave.employee_id.id, leave.holiday_status_id.id, year)] += days
+        return usage
+
+    def _get_usage_keys(self):
+        """Clés du registre couvertes par self, quel que soit l'état des congés."""
+        return {
+            (leave.employee_id.id, leave.holiday_status_id.id, year)
+            for leave in self
+            if leave.employee_id and leave.holiday_status_id
+            for year in leave._get_days_by_year()
+        }
+
+    def _update_usage_summary(self, sign=1):
+        """Ajouter (sign=1) ou retirer (sign=-1) la contribution de self au registre."""
+        usage = self._get_usage_by_key()
+        if usage:
+            self.env['hr.leave.usage.summary'].sudo()._apply_deltas(
+                {key: sign * days for key, days in usage.items()}
+            )
+
+    def _refresh_usage_summary(self, keys):
+        """Recalculer les lignes keys du registre depuis les congés : chaque congé y
+        compte une seule fois, même si create, write et action_validate s'enchaînent."""
+        self.env['hr.leave.usage.summary'].sudo()._refresh_usage(keys)
+
+    def _compute_duration(self):
+        """Un recalcul de number_of_days hors write (calendrier de l'employé, jours
+        fériés) met à jour le registre à la validation de la transaction."""
+        super()._compute_duration()
+        keys = self.filtered(lambda leave: leave.id and leave.state in QUOTA_STATES)._get_usage_keys()
+        if keys:
+            precommit = self.env.cr.precommit
+            if 'timeoff.usage_summary_keys' not in precommit.data:
+                precommit.add(self.env['hr.leave.usage.summary']._refresh_pending_usage)
+            precommit.data.setdefault('timeoff.usage_summary_keys', set()).update(keys)
+
+    def _check_yearly_quotas(self, message, in_summary=False):
+        """Vérifier les quotas annuels (hr.leave.quota.policy) pour tout le lot
+        à partir du registre des consommations.
+
+        :param message: message d'erreur, formaté avec leave_type et max_days
+        :param in_summary: True si les congés validés du lot sont déjà comptés dans le
+            registre (hors create/write, où leur contribution en est retirée)
+        """
+        Policy = self.env['hr.leave.quota.policy']
+        max_days_by_leave = {}
+        for leave in self:
+            if not leave.employee_id or not leave.date_from:
+                continue
+            max_days = Policy._get_max_days(
+                leave.holiday_status_id.id,
+                leave.employee_id.department_id.id,
+                leave.employee_id.company_id.id,
+            )
+            if max_days is not None:
+                max_days_by_leave[leave] = max_days
+        leaves = self.browse([leave.id for leave in max_days_by_leave])
+        if not leaves:
+            return
+
+        days_by_leave = {leave: leave._get_days_by_year() for leave in leaves}
+        keys = {
+            (leave.employee_id.id, leave.holiday_status_id.id, year)
+            for leave, days_by_year in days_by_leave.items()
+            for year in days_by_year
+        }
+        usage = defaultdict(float, self.env['hr.leave.usage.summary'].sudo()._get_usage(keys))
+
+        # Les congés du lot déjà validés comptent pour les autres congés du lot
+        for leave, days_by_year in days_by_leave.items():
+            if not in_summary and leave.state in QUOTA_STATES:
+                for year, days in days_by_year.items():
+                    usage[(leave.employee_id.id, leave.holiday_status_id.id, year)] += days
+
+        # Les autres s'ajoutent au cumul au fil du contrôle : deux congés du même lot
+        # ne peuvent pas consommer chacun le reliquat
+        for leave, days_by_year in days_by_leave.items():
+            max_days = max_days_by_leave[leave]
+            for year, days in days_by_year.items():
+                key = (leave.employee_id.id, leave.holiday_status_id.id, year)
+                if leave.state not in QUOTA_STATES:
+                    usage[key] += days
+                if float_compare(usage[key], max_days, precision_digits=2) > 0:
+                    raise ValidationError(message % {
+                        'leave_type': leave.holiday_status_id.display_name,
+                        'max_days': max_days,
+                    })
     
 
     def _get_refuse_wizard_action(self):
-        """Retourne l'action qui ouvre le wizard de refus pour l'enregistrement courant."""
-        self.ensure_one()
+        """Retourne l'action qui ouvre le wizard de refus pour les enregistrements courants."""
         action = self.env.ref('timeoff.action_leave_refuse_wizard').read()[0]
 
         action['context'] = {
             **self._context,
-            'active_id': self.id,
-            'active_ids': [self.id],
+            'active_id': self[:1].id,
+            'active_ids': self.ids,
             'active_model': 'hr.leave',
         }
         return action
 
 
+    @profiled
     def action_refuse(self):
         """
         Si appelé depuis la liste (ou n'importe où) SANS passer par le wizard,
@@ -66,6 +221,7 @@ class HrLeave(models.Model):
         self.mapped('meeting_id').write({'active': False})
 
 
+        notifications = []
         for holiday in self:
             if holiday.employee_id.user_id:
                 body = _('Votre %(leave_type)s prévu le %(date)s a été refusé.') % {
@@ -75,12 +231,14 @@ class HrLeave(models.Model):
                 if holiday.refuse_reason:
                     body += ' ' + _('Raison : %s') % holiday.refuse_reason
 
-                holiday.with_context(tracking_disable=True, mail_notrack=True).message_post(
-                    body=body,
-                    partner_ids=holiday.employee_id.user_id.partner_id.ids,
-                )
+                notifications.append({
+                    'leave_id': holiday.id,
+                    'partner_id': holiday.employee_id.user_id.partner_id.id,
+                    'body': body,
+                })
+        self.env['hr.leave.notification.outbox']._enqueue(notifications)
 
-        self.activity_update()
+        self._reconcile_activities()
         return True
 
 
@@ -89,84 +247,142 @@ class HrLeave(models.Model):
         if self.state != 'refuse':
             self.refuse_reason = False
     
+    @profiled
     def _validate_leave_request(self):
         """Surcharge pour désactiver l'email automatique d'approbation"""
-        import pytz
-        from pytz import timezone
-        
         holidays = self.filtered("employee_id")
         holidays._create_resource_leave()
         meeting_holidays = holidays.filtered(lambda l: l.holiday_status_id.create_calendar_meeting)
-        meetings = self.env['calendar.event']
         
         if meeting_holidays:
+            # Un seul create pour tous les propriétaires : user_id est déjà dans les valeurs
             meeting_values_for_user_id = meeting_holidays._prepare_holidays_meeting_values()
-            Meeting = self.env['calendar.event']
-            for user_id, meeting_values in meeting_values_for_user_id.items():
-                meetings += Meeting.with_user(user_id or self.env.uid).with_context(
-                                allowed_company_ids=[],
-                                no_mail_to_attendees=True,
-                                calendar_no_videocall=True,
-                                active_model=self._name
-                            ).create(meeting_values)
-        
-        Holiday = self.env['hr.leave']
-        for meeting in meetings:
-            Holiday.browse(meeting.res_id).meeting_id = meeting
-
-
+            meetings = self.env['calendar.event'].sudo().with_context(
+                allowed_company_ids=[],
+                no_mail_to_attendees=True,
+                calendar_no_videocall=True,
+                active_model=self._name
+            ).create([
+                values
+                for meeting_values in meeting_values_for_user_id.values()
+                for values in meeting_values
+            ])
+            meeting_holidays._link_meetings(meetings)
+
+        timezones = {}
+        notifications = []
         for holiday in holidays:
             if holiday.employee_id.user_id:
-                user_tz = timezone(holiday.tz)
+                if holiday.tz not in timezones:
+                    timezones[holiday.tz] = timezone(holiday.tz)
+                user_tz = timezones[holiday.tz]
                 utc_tz = pytz.utc.localize(holiday.date_from).astimezone(user_tz)
                 
                 body = _('Votre %(leave_type)s prévu le %(date)s a été accepté.') % {
                     'leave_type': holiday.holiday_status_id.display_name,
                     'date': utc_tz.strftime('%d/%m/%Y')
                 }
-                
-
-                holiday.with_context(tracking_disable=True, mail_notrack=True).message_post(
-                    body=body,
-                    partner_ids=holiday.employee_id.user_id.partner_id.ids
-                )
-
+                notifications.append({
+                    'leave_id': holiday.id,
+                    'partner_id': holiday.employee_id.user_id.partner_id.id,
+                    'body': body,
+                })
+
+        # Les messages sont publiés par le cron après la validation
+        self.env['hr.leave.notification.outbox']._enqueue(notifications)
+
+    def _link_meetings(self, meetings):
+        """Rattacher les rendez-vous à leurs congés (res_id) en une seule requête."""
+        if not meetings:
+            return
+        self.env['hr.leave'].flush_model(['meeting_id'])
+        self.env.cr.execute("""
+            UPDATE hr_leave l
+               SET meeting_id = m.meeting_id
+              FROM unnest(%s::int[], %s::int[]) AS m(leave_id, meeting_id)
+             WHERE l.id = m.leave_id
+        """, (meetings.mapped('res_id'), meetings.ids))
+        self.env['hr.leave'].browse(meetings.mapped('res_id')).invalidate_recordset(['meeting_id'])
+
+    @profiled
     def write(self, values):
-        """Surcharger write pour désactiver le tracking sur le champ state"""
+        """Surcharger write pour désactiver le tracking sur le champ state
+        et tenir à jour le registre des consommations.
+
+        La contribution de self est retirée du registre pendant l'écriture (les
+        contraintes de quota la recomptent), puis les clés avant et après écriture
+        sont recalculées en valeur absolue."""
+        update_summary = not USAGE_SUMMARY_FIELDS.isdisjoint(values)
+        if update_summary:
+            keys = self._get_usage_keys()
+            self._update_usage_summary(sign=-1)
 
         if 'state' in values and values.get('state') in ['validate', 'validate1']:
 
-            return super(HrLeave, self.with_context(
+            result = super(HrLeave, self.with_context(
                 tracking_disable=True,
                 mail_notrack=True
             )).write(values)
-        return super().write(values)
+        else:
+            result = super().write(values)
+
+        if update_summary:
+            self._refresh_usage_summary(keys | self._get_usage_keys())
+        return result
+
+    @profiled
+    def unlink(self):
+        keys = self._get_usage_by_key().keys()
+        result = super().unlink()
+        self._refresh_usage_summary(set(keys))
+        return result
     
 
+    @profiled
+    def _check_department_capacity(self):
+        """Refuser la validation si, un jour donné, la part d'absents d'un département
+        dépasse son taux maximal, en comptant les congés validés, ceux en attente de
+        seconde approbation et tout le lot."""
+        leaves = self.filtered(lambda leave: leave.employee_id.department_id.max_absence_rate
+                               and leave.request_date_from and leave.request_date_to)
+        if not leaves:
+            return
+        departments = leaves.employee_id.department_id
+        segments_by_department = departments._get_absence_segments(
+            min(leaves.mapped('request_date_from')),
+            max(leaves.mapped('request_date_to')),
+            extra_leave_ids=leaves.ids,
+        )
+        headcounts = departments._get_headcounts()
+
+        errors = []
+        for department in departments:
+            segments = segments_by_department[department.id]
+            segment_ends = [end for start, end, count in segments]
+            capacity = department.max_absence_rate * headcounts.get(department.id, 0) / 100
+            department_leaves = leaves.filtered(lambda leave: leave.employee_id.department_id == department)
+            peak, peak_day = max((
+                department._get_absence_peak(segments, segment_ends, leave.request_date_from, leave.request_date_to)
+                for leave in department_leaves
+            ), key=lambda peak_and_day: peak_and_day[0])
+            if peak > capacity:
+                errors.append(_(
+                    "%(department)s : %(peak)d absent(s) le %(day)s pour %(headcount)d employé(s) "
+                    "(maximum %(rate)g %%).",
+                    department=department.display_name, peak=peak, day=format_date(self.env, peak_day),
+                    headcount=headcounts.get(department.id, 0), rate=department.max_absence_rate,
+                ))
+        if errors:
+            raise ValidationError(_("Capacité d'absence dépassée :\n%s", '\n'.join(errors)))
+
+    @profiled
     def action_validate(self, check_state=True):
 
-        sick_leave_type = self.env.ref('hr_holidays.holiday_status_sl', raise_if_not_found=False)
-
-
-        for leave in self:
-            if sick_leave_type and leave.holiday_status_id.id == sick_leave_type.id:
-                year = leave.date_from.year
-                domain = [
-                    ('employee_id', '=', leave.employee_id.id),
-                    ('holiday_status_id', '=', sick_leave_type.id),
-                    ('state', 'in', ['validate', 'validate1']),
-                    ('date_from', '>=', f'{year}-01-01'),
-                    ('date_to', '<=', f'{year}-12-31'),
-                ]
-                sick_leaves = self.search(domain)
-
-
-                total_sick_days = sum(l.number_of_days for l in sick_leaves if l.id != leave.id)
-                if leave.state not in ['validate', 'validate1']:
-                    total_sick_days += leave.number_of_days
-
-                if total_sick_days > 5:
-                    raise ValidationError(_("Le congé maladie est limité à 5 jours par année."))
+        self._check_yearly_quotas(
+            _("Le type de congé « %(leave_type)s » est limité à %(max_days)g jours par année."),
+            in_summary=True,
+        )
+        self._check_department_capacity()
 
         current_employee = self.env.user.employee_id
         leaves = self._get_leaves_on_public_holiday()
@@ -195,96 +411,97 @@ class HrLeave(models.Model):
 
         self._validate_leave_request()
         if not self.env.context.get('leave_fast_create'):
-            self.filtered(lambda holiday: holiday.validation_type != 'no_validation').activity_update()
+            self.filtered(lambda holiday: holiday.validation_type != 'no_validation')._reconcile_activities()
         return True
     
     @api.constrains('holiday_status_id', 'employee_id', 'date_from', 'date_to', 'number_of_days')
+    @profiled
     def _check_sick_leave_limit(self):
-        sick_leave_type = self.env.ref('hr_holidays.holiday_status_sl', raise_if_not_found=False)
-        paid_leave_type = self.env.ref('hr_holidays.holiday_status_cl', raise_if_not_found=False)  
-
-        for leave in self:
-
-            if sick_leave_type and leave.holiday_status_id.id == sick_leave_type.id:
-                year = leave.date_from.year
-                domain = [
-                    ('employee_id', '=', leave.employee_id.id),
-                    ('holiday_status_id', '=', sick_leave_type.id),
-                    ('state', 'in', ['validate', 'validate1']),
-                    ('date_from', '>=', f'{year}-01-01'),
-                    ('date_to', '<=', f'{year}-12-31'),
-                    ('id', '!=', leave.id),
-                ]
-                sick_leaves = self.search(domain)
-                total_sick_days = sum(l.number_of_days for l in sick_leaves) + leave.number_of_days
-                if total_sick_days > 5:
-                    raise ValidationError(_("Impossible d'envoyer la demande : le congé maladie est limité à 5 jours par année."))
-
-
-            if paid_leave_type and leave.holiday_status_id.id == paid_leave_type.id:
-                year = leave.date_from.year
-                domain = [
-                    ('employee_id', '=', leave.employee_id.id),
-                    ('holiday_status_id', '=', paid_leave_type.id),
-                    ('state', 'in', ['validate', 'validate1']),
-                    ('date_from', '>=', f'{year}-01-01'),
-                    ('date_to', '<=', f'{year}-12-31'),
-                    ('id', '!=', leave.id),
-                ]
-                paid_leaves = self.search(domain)
-                total_paid_days = sum(l.number_of_days for l in paid_leaves) + leave.number_of_days
-                if total_paid_days > 20:
-                    raise ValidationError(_("Impossible d'envoyer la demande : le congé payé est limité à 20 jours par année."))
+        self._check_yearly_quotas(
+            _("Impossible d'envoyer la demande : le type de congé « %(leave_type)s » est limité à %(max_days)g jours par année.")
+        )
                 
     @api.constrains('employee_id', 'holiday_status_id', 'date_from', 'date_to')
+    @profiled
     def _check_allocation_period(self):
-        for leave in self:
-            if leave.holiday_status_id.requires_allocation == 'yes':
-                allocation = self.env['hr.leave.allocation'].search([
-                    ('employee_id', '=', leave.employee_id.id),
-                    ('holiday_status_id', '=', leave.holiday_status_id.id),
-                    ('state', '=', 'validate'),
-                ], limit=1)
-
-                if allocation:
-                    # Vérifier seulement si l'allocation a des dates définies
-                    if allocation.date_from and allocation.date_to:
-                        # Convertir les dates pour la comparaison
-                        alloc_from = self._convert_to_date(allocation.date_from)
-                        alloc_to = self._convert_to_date(allocation.date_to)
-                        leave_from = self._convert_to_date(leave.date_from)
-                        leave_to = self._convert_to_date(leave.date_to)
-                        
-                        if not (alloc_from <= leave_from and alloc_to >= leave_to):
-                            raise ValidationError(_("Impossible d'envoyer la demande : la période demandée dépasse la période programmée dans l'allocation."))
-                    # Si pas de dates sur l'allocation, c'est une allocation permanente -> OK
+        leaves = self.filtered(lambda l: l.holiday_status_id.requires_allocation == 'yes')
+        if not leaves:
+            return
+
+        windows = leaves._get_allocation_windows()
+        for leave in leaves:
+            key = (leave.employee_id.id, leave.holiday_status_id.id)
+            if key not in windows:
+                raise ValidationError(_("Aucune allocation valide trouvée pour ce type de congé."))
+
+            starts, ends = windows[key]
+            leave_from = self._convert_to_date(leave.date_from)
+            leave_to = self._convert_to_date(leave.date_to)
+            index = bisect_right(starts, leave_from) - 1
+            if index < 0 or ends[index] < leave_to:
+                raise ValidationError(_("Impossible d'envoyer la demande : la période demandée dépasse la période programmée dans l'allocation."))
+
+    def _get_allocation_windows(self, employee_ids=None, type_ids=None):
+        """Charger en une requête les allocations validées des employés/types de self (ou
+        de employee_ids/type_ids) et les fusionner en fenêtres triées et disjointes.
+
+        Les allocations consécutives (ou qui se chevauchent) sont fusionnées pour qu'un
+        congé à cheval sur deux allocations soit couvert. Une allocation sans date de
+        fin (ou de début) est une allocation permanente de ce côté.
+
+        :return: dict {(employee_id, holiday_status_id): (débuts triés, fins correspondantes)}
+        """
+        allocations = self.env['hr.leave.allocation'].search_read([
+            ('employee_id', 'in', self.employee_id.ids if employee_ids is None else list(employee_ids)),
+            ('holiday_status_id', 'in', self.holiday_status_id.ids if type_ids is None else list(type_ids)),
+            ('state', '=', 'validate'),
+        ], ['employee_id', 'holiday_status_id', 'date_from', 'date_to'])
+
+        intervals = defaultdict(list)
+        for allocation in allocations:
+            intervals[(allocation['employee_id'][0], allocation['holiday_status_id'][0])].append((
+                self._convert_to_date(allocation['date_from']) or date.min,
+                self._convert_to_date(allocation['date_to']) or date.max,
+            ))
+
+        windows = {}
+        for key, key_intervals in intervals.items():
+            starts, ends = [], []
+            for start, end in sorted(key_intervals):
+                if ends and (ends[-1] == date.max or start <= ends[-1] + timedelta(days=1)):
+                    ends[-1] = max(ends[-1], end)
                 else:
-                    raise ValidationError(_("Aucune allocation valide trouvée pour ce type de congé."))
+                    starts.append(start)
+                    ends.append(end)
+            windows[key] = (starts, ends)
+        return windows
     
     @api.model_create_multi
+    @profiled
     def create(self, vals_list):
         holidays = super(HrLeave, self).create(vals_list)
+        # Les congés validés d'office passent par action_validate, donc par write :
+        # le recalcul absolu ne les compte pas une seconde fois
+        holidays._refresh_usage_summary(set(holidays._get_usage_by_key()))
+        if not self.env.context.get('timeoff_skip_notification'):
+            holidays._notify_new_requests()
+        return holidays
+
+    def _notify_new_requests(self):
+        """Abonner l'administrateur et le manager puis publier l'annonce de la demande,
+        en regroupant les abonnements par ensemble de partenaires et les messages en un lot."""
         admin_user = self.env.ref('base.user_admin', raise_if_not_found=False)
+        types_sans_email = self.env['hr.leave.type']
+        for xml_id in TYPES_SANS_EMAIL:
+            types_sans_email |= self.env.ref(xml_id, raise_if_not_found=False) or self.env['hr.leave.type']
 
-        
-        types_sans_email = [
-            'hr_holidays.holiday_status_cl',
-            'hr_holidays.holiday_status_sl',
-            'hr_holidays.holiday_status_unpaid',
-            'hr_holidays.holiday_status_comp',
-           # 'hr_holidays_attendance.holiday_status_extra_hours',
-            'hr_holidays.hr_holiday_status_dv',
-            'hr_holidays.holiday_status_training',
-        ]
+        holidays = self.filtered(
+            lambda holiday: holiday.holiday_status_id and holiday.holiday_status_id not in types_sans_email
+        )
 
+        holidays_by_partners = defaultdict(lambda: self.env['hr.leave'])
+        messages = []
         for holiday in holidays:
-            if not holiday.holiday_status_id:
-                continue
-
-
-            if any(holiday.holiday_status_id.id == self.env.ref(xml_id).id for xml_id in types_sans_email):
-                continue
-
             employee = holiday.employee_id
             manager_partner = (
                 employee.parent_id.user_id.partner_id
@@ -297,14 +514,12 @@ class HrLeave(models.Model):
                 partner_ids_to_subscribe.add(admin_user.partner_id.id)
             if manager_partner:
                 partner_ids_to_subscribe.add(manager_partner.id)
+            if partner_ids_to_subscribe:
+                holidays_by_partners[frozenset(partner_ids_to_subscribe)] |= holiday
 
-            existing_followers = set(holiday.message_follower_ids.mapped('partner_id').ids)
-            new_followers = list(partner_ids_to_subscribe - existing_followers)
-            if new_followers:
-                holiday.message_subscribe(partner_ids=new_followers)
-
-            holiday.with_context().message_post(
-                body=_(
+            messages.append({
+                'res_id': holiday.id,
+                'body': _(
                     "Nouvelle demande de congé :\n"
                     "- Employé : %(employee)s\n"
                     "- Type de congé : %(type)s\n"
@@ -316,7 +531,130 @@ class HrLeave(models.Model):
                     'date_from': holiday.request_date_from.strftime('%d/%m/%Y') if holiday.request_date_from else 'N/A',
                     'date_to': holiday.request_date_to.strftime('%d/%m/%Y') if holiday.request_date_to else 'N/A',
                 },
-                subtype_xmlid='mail.mt_comment',
-            )
+                'subtype_xmlid': 'mail.mt_comment',
+            })
+
+        # message_subscribe ignore déjà les abonnés existants, en une requête par groupe
+        for partner_ids, partner_holidays in holidays_by_partners.items():
+            partner_holidays.message_subscribe(partner_ids=list(partner_ids))
+        self._message_post_batch(messages)
+
+    def _message_post_batch(self, messages):
+        """Publier des messages dans le chatter de plusieurs congés avec une seule création.
+
+        Seule la création des messages est groupée : chaque message est ensuite
+        notifié par _notify_thread, qui recherche ses destinataires (abonnés et
+        partner_ids) et envoie les e-mails message par message. Le nombre de
+        requêtes reste donc proportionnel au nombre de messages.
+
+        :param messages: liste de dicts avec res_id, body et, optionnellement,
+            partner_ids (destinataires), author_id (utilisateur courant par défaut)
+            et subtype_xmlid (mail.mt_note par défaut)
+        """
+        if not messages:
+            return self.env['mail.message']
 
-        return holidays
\ No newline at end of file
+        default_author_id = self.env.user.partner_id.id
+        authors = self.env['res.partner'].browse({
+            message.get('author_id') or default_author_id for message in messages
+        })
+        subtype_ids = {
+            xml_id: self.env['ir.model.data']._xmlid_to_res_id(xml_id)
+            for xml_id in {message.get('subtype_xmlid') or 'mail.mt_note' for message in messages}
+        }
+        values_list = []
+        for message in messages:
+            author = authors.browse(message.get('author_id') or default_author_id)
+            values_list.append({
+                'model': self._name,
+                'res_id': message['res_id'],
+                'body': plaintext2html(message['body']),
+                'message_type': 'notification',
+                'subtype_id': subtype_ids[message.get('subtype_xmlid') or 'mail.mt_note'],
+                'author_id': author.id,
+                'email_from': author.email_formatted,
+                'partner_ids': list(message.get('partner_ids') or []),
+            })
+
+        records = self.env['hr.leave'].browse([values['res_id'] for values in values_list])
+        new_messages = records._message_create(values_list)
+        for new_message, values in zip(new_messages, values_list):
+            records.browse(values['res_id'])._notify_thread(new_message, values)
+        return new_messages
+
+    @profiled
+    def _reconcile_activities(self):
+        """Équivalent ensembliste d'activity_update() pour l'approbation et le refus.
+
+        Les activités d'approbation ouvertes du lot sont lues en une requête et
+        comparées à l'état de chaque congé ; les activités manquantes sont créées en
+        un seul create et celles des congés refusés supprimées en un seul unlink.
+        Les activités traitées sont marquées comme faites par activity_feedback,
+        un appel par lot, qui publie le message « fait » d'Odoo pour chacune.
+        """
+        if not self or self.env.context.get('mail_activity_automation_skip'):
+            return
+        confirm_type = self.env.ref('hr_holidays.mail_act_leave_approval')
+        second_type = self.env.ref('hr_holidays.mail_act_leave_second_approval')
+        Activity = self.env['mail.activity'].sudo()
+        open_activities = defaultdict(list)
+        for activity in Activity.search([
+            ('res_model', '=', self._name),
+            ('res_id', 'in', self.ids),
+            ('activity_type_id', 'in', (confirm_type | second_type).ids),
+        ]):
+            open_activities[activity.res_id].append(activity)
+
+        model_id = self.env['ir.model']._get_id(self._name)
+        today = fields.Date.today()
+        to_create, unlink_ids, validated_ids, second_approval_ids = [], [], [], []
+        for leave in self:
+            activities = open_activities[leave.id]
+            if leave.state == 'refuse':
+                unlink_ids += [activity.id for activity in activities]
+            elif leave.state == 'validate':
+                if activities:
+                    validated_ids.append(leave.id)
+            elif leave.state in ('confirm', 'validate1') \
+                    and leave.holiday_status_id.leave_validation_type != 'no_validation':
+                if leave.state == 'confirm':
+                    activity_type = confirm_type
+                    note = _("Nouvelle demande de %(leave_type)s créée par %(user)s",
+                             leave_type=leave.holiday_status_id.name, user=leave.create_uid.name)
+                else:
+                    activity_type = second_type
+                    note = _("Seconde approbation demandée pour %(leave_type)s",
+                             leave_type=leave.holiday_status_id.name)
+                    if any(activity.activity_type_id == confirm_type for activity in activities):
+                        second_approval_ids.append(leave.id)
+                scheduled_user_ids = {
+                    activity.user_id.id for activity in activities if activity.activity_type_id == activity_type
+                }
+                date_deadline = today
+                if leave.date_from:
+                    date_deadline = max(today, (leave.date_from - relativedelta(**{
+                        activity_type.delay_unit or 'days': activity_type.delay_count or 0,
+                    })).date())
+                to_create += [{
+                    'activity_type_id': activity_type.id,
+                    'automated': True,
+                    'date_deadline': date_deadline,
+                    'note': note,
+                    'user_id': user_id,
+                    'res_id': leave.id,
+                    'res_model_id': model_id,
+                } for user_id in leave.sudo()._get_responsible_for_approval().ids or self.env.user.ids
+                    if user_id not in scheduled_user_ids]
+
+        if unlink_ids:
+            Activity.browse(unlink_ids).unlink()
+        if validated_ids:
+            self.browse(validated_ids).activity_feedback([
+                'hr_holidays.mail_act_leave_approval', 'hr_holidays.mail_act_leave_second_approval',
+            ])
+        if second_approval_ids:
+            self.browse(second_approval_ids).activity_feedback(['hr_holidays.mail_act_leave_approval'])
+        if to_create:
+            # Sans mail_activity_quick_update : chaque approbateur est notifié de
+            # l'activité qui lui est assignée, comme avec activity_schedule
+            self.env['mail.activity'].with_context(short_name=False).create(to_create)
@@ -0,0 +1,164 @@
+import logging
+
+from odoo import api, fields, models
+from odoo.tools import SQL, create_index
+
+_logger = logging.getLogger(__name__)
+
+
+class HrLeaveAllocation(models.Model):
+    _inherit = 'hr.leave.allocation'
+
+    allocation_rule_id = fields.Many2one(
+        'hr.leave.allocation.rule', string="Règle d'allocation", readonly=True, index=True,
+        ondelete='set null', copy=False)
+    allocation_origin = fields.Selection([
+        ('rule', "Règle d'allocation"),
+        ('mass', "Allocation massive"),
+    ], string="Origine", readonly=True, copy=False,
+        help="Seules les allocations créées par une règle sont réalignées sur elle lorsqu'elle est réappliquée.")
+    carried_over_days = fields.Float(
+        string="Jours reportés", readonly=True, copy=False,
+        help="Jours reportés de l'année précédente par le renouvellement annuel, inclus dans le nombre de jours.")
+
+    _sql_constraints = [
+        # Sans date de début, l'année de l'index unique des règles serait NULL et
+        # n'empêcherait plus les doublons
+        ('rule_allocation_date_from_required', 'CHECK(allocation_rule_id IS NULL OR date_from IS NOT NULL)',
+         "Une allocation issue d'une règle d'allocation doit avoir une date de début."),
+    ]
+
+    def init(self):
+        # Une seule allocation automatique par employé, type, règle et année, même entre
+        # transactions concurrentes (cible de ON CONFLICT des insertions de règles)
+        self.env.cr.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS hr_leave_allocation_rule_employee_year_uniq
+                ON hr_leave_allocation (employee_id, holiday_status_id, allocation_rule_id, (EXTRACT(YEAR FROM date_from)))
+             WHERE allocation_rule_id IS NOT NULL
+        """)
+        # Allocations existantes par employé et type (règles, allocation massive) et
+        # fenêtres d'allocation en cours (contrôle de période des congés)
+        create_index(self.env.cr, 'hr_leave_allocation_employee_type_state_idx', self._table,
+                     ['employee_id', 'holiday_status_id', 'state'])
+        create_index(self.env.cr, 'hr_leave_allocation_current_employee_type_period_idx', self._table,
+                     ['employee_id', 'holiday_status_id', 'date_from', 'date_to'],
+                     where="state IN ('validate', 'confirm')")
+
+    @api.model
+    def _mass_allocate(self, employees, leave_type, number_of_days, name, rule=None):
+        """Allouer number_of_days jours de leave_type à chaque employé, de façon ensembliste.
+
+        L'allocation en cours la plus récente de chaque employé (validée ou confirmée,
+        valable aujourd'hui) est incrémentée, en une requête ; les allocations manquantes sont créées en un seul create puis
+        approuvées ensemble. En cas d'échec du lot, les créations sont rejouées
+        employé par employé pour isoler les erreurs. Les allocations créées sont
+        rattachées à rule lorsqu'elle est fournie ; créées ou complétées ici, elles
+        ont l'origine « allocation massive » et la règle ne les réaligne plus.
+
+        :return: dict {employee_id: (statut, message)} avec statut dans
+            'updated', 'created' ou 'failed'
+        """
+        results = {}
+        if not employees:
+            return results
+
+        Allocation = self.env['hr.leave.allocation'].sudo()
+        Allocation.flush_model(['employee_id', 'holiday_status_id', 'state', 'number_of_days', 'date_from', 'date_to'])
+        today = fields.Date.today()
+        self.env.cr.execute("""
+            SELECT DISTINCT ON (employee_id) employee_id, id
+              FROM hr_leave_allocation
+             WHERE employee_id = ANY(%s)
+               AND holiday_status_id = %s
+               AND state IN ('validate', 'confirm')
+               AND date_from <= %s
+               AND (date_to IS NULL OR date_to >= %s)
+             ORDER BY employee_id, id DESC
+        """, (employees.ids, leave_type.id, today, today))
+        existing = dict(self.env.cr.fetchall())
+
+        Allocation._increment_number_of_days({
+            allocation_id: number_of_days for allocation_id in existing.values()
+        })
+        self.env.cr.execute("""
+            UPDATE hr_leave_allocation
+               SET allocation_origin = 'mass'
+             WHERE id = ANY(%s) AND allocation_origin = 'rule'
+        """, (list(existing.values()),))
+        Allocation.browse(existing.values()).invalidate_recordset(['allocation_origin'])
+        for employee_id in existing:
+            results[employee_id] = ('updated', False)
+
+        missing = employees.filtered(lambda employee: employee.id not in existing)
+        vals_list = [{
+            'name': name,
+            'employee_id': employee.id,
+            'holiday_status_id': leave_type.id,
+            'number_of_days': number_of_days,
+            'allocation_type': 'regular',
+            'allocation_rule_id': rule.id if rule else False,
+            'allocation_origin': 'mass',
+        } for employee in missing]
+        try:
+            with self.env.cr.savepoint():
+                Allocation.create(vals_list)._approve_created_allocations()
+            for employee in missing:
+                results[employee.id] = ('created', False)
+        except Exception:
+            _logger.info("Échec de l'allocation en lot, reprise employé par employé", exc_info=True)
+            for vals in vals_list:
+                try:
+                    with self.env.cr.savepoint():
+                        Allocation.create(vals)._approve_created_allocations()
+                    results[vals['employee_id']] = ('created', False)
+                except Exception as e:
+                    results[vals['employee_id']] = ('failed', str(e))
+        return results
+
+    def _approve_created_allocations(self):
+        if hasattr(self, 'action_approve'):
+            self.action_approve()
+        elif hasattr(self, 'action_validate'):
+            self.action_validate()
+        else:
+            self.write({'state': 'validate'})
+
+    @api.model
+    def _increment_number_of_days(self, increments):
+        """Ajouter des jours à des allocations {allocation_id: jours} en une seule requête."""
+        self._update_number_of_days(increments, increment=True)
+
+    @api.model
+    def _set_number_of_days(self, values):
+        """Fixer le nombre de jours d'allocations {allocation_id: jours} en une seule requête."""
+        self._update_number_of_days(values, increment=False)
+
+    @api.model
+    def _update_number_of_days(self, values, increment):
+        if not values:
+            return
+        self.flush_model(['number_of_days'])
+        allocation_ids = list(values)
+        self.env.cr.execute(SQL(
+            """
+            UPDATE hr_leave_allocation a
+               SET number_of_days = %s,
+                   write_uid = %s,
+                   write_date = NOW() AT TIME ZONE 'UTC'
+              FROM unnest(%s::int[], %s::float[]) AS v(id, days)
+             WHERE a.id = v.id
+            """,
+            SQL("a.number_of_days + v.days") if increment else SQL("v.days"),
+            self.env.uid,
+            allocation_ids,
+            [values[allocation_id] for allocation_id in allocation_ids],
+        ))
+        allocations = self.browse(allocation_ids)
+        allocations.invalidate_recordset(['number_of_days', 'write_uid', 'write_date'])
+        allocations.modified(['number_of_days'])
+
+    def _mark_inserted_for_compute(self, inserted_fnames):
+        """Après un INSERT SQL, planifier le calcul des champs calculés stockés non fournis."""
+        for fname, field in self._fields.items():
+            if field.store and field.compute and fname not in inserted_fnames:
+                self.env.add_to_compute(field, self)
@@ -0,0 +1,167 @@
+import logging
+import threading
+import time
+
+from odoo import api, fields, models, _
+
+_logger = logging.getLogger(__name__)
+
+# Durée maximale d'un passage du cron avant de se relancer
+CRON_TIME_BUDGET = 240
+# Crons identiques se partageant les lots : Odoo n'exécutant jamais deux passages
+# d'un même cron en parallèle, chacun est un worker (dans la limite de max_cron_threads)
+MASS_JOB_CRONS = (
+    'timeoff.ir_cron_leave_allocation_mass_job',
+    'timeoff.ir_cron_leave_allocation_mass_job_2',
+    'timeoff.ir_cron_leave_allocation_mass_job_3',
+)
+
+
+class HrLeaveAllocationMassJob(models.Model):
+    _name = 'hr.leave.allocation.mass.job'
+    _description = 'Mass Leave Allocation Job'
+    _order = 'id desc'
+
+    name = fields.Char(string="Nom", required=True, readonly=True)
+    holiday_status_id = fields.Many2one('hr.leave.type', string="Type de congé", required=True, readonly=True)
+    number_of_days = fields.Float(string="Nombre de jours", required=True, readonly=True)
+    department_ids = fields.Many2many('hr.department', string="Départements", readonly=True)
+    allocation_rule_id = fields.Many2one(
+        'hr.leave.allocation.rule', string="Règle d'allocation", readonly=True, ondelete='set null')
+    chunk_ids = fields.One2many('hr.leave.allocation.mass.job.chunk', 'job_id', string="Lots", readonly=True)
+    state = fields.Selection([
+        ('pending', 'En attente'),
+        ('running', 'En cours'),
+        ('done', 'Terminé'),
+        ('failed', 'Terminé avec erreurs'),
+    ], string="État", compute='_compute_progress')
+    chunk_count = fields.Integer(string="Lots", compute='_compute_progress')
+    processed_chunk_count = fields.Integer(string="Lots traités", compute='_compute_progress')
+    progress = fields.Float(string="Avancement (%)", compute='_compute_progress')
+    error_log = fields.Text(string="Journal des erreurs", compute='_compute_progress')
+
+    @api.depends('chunk_ids.state', 'chunk_ids.error')
+    def _compute_progress(self):
+        for job in self:
+            chunks = job.chunk_ids
+            processed = chunks.filtered(lambda c: c.state != 'pending')
+            job.chunk_count = len(chunks)
+            job.processed_chunk_count = len(processed)
+            job.progress = 100.0 * len(processed) / len(chunks) if chunks else 100.0
+            job.error_log = '\n\n'.join(
+                f'{_("Lot")} {chunk.sequence} : {chunk.error}' for chunk in chunks if chunk.error
+            ) or False
+            if not processed:
+                job.state = 'pending'
+            elif len(processed) < len(chunks):
+                job.state = 'running'
+            elif any(chunk.state == 'failed' or chunk.failed_count for chunk in chunks):
+                job.state = 'failed'
+            else:
+                job.state = 'done'
+
+    @api.model
+    def _enqueue(self, leave_type, number_of_days, departments, rule=None):
+        """Créer un job et découper les employés des départements en lots à traiter par le cron."""
+        chunk_size = int(self.env['ir.config_parameter'].sudo().get_param(
+            'timeoff.mass_allocation_chunk_size', 500))
+        employee_ids = self.env['hr.employee'].search([('department_id', 'in', departments.ids)], order='id').ids
+        job = self.create({
+            'name': _('Allocation massive - %(type)s - %(days)s jour(s)', type=leave_type.name, days=number_of_days),
+            'holiday_status_id': leave_type.id,
+            'number_of_days': number_of_days,
+            'department_ids': [(6, 0, departments.ids)],
+            'allocation_rule_id': rule.id if rule else False,
+            'chunk_ids': [(0, 0, {
+                'sequence': sequence,
+                'employee_ids': [(6, 0, employee_ids[start:start + chunk_size])],
+            }) for sequence, start in enumerate(range(0, len(employee_ids), chunk_size), start=1)],
+        })
+        self._trigger_workers()
+        return job
+
+    @api.model
+    def _trigger_workers(self):
+        for xml_id in MASS_JOB_CRONS:
+            cron = self.env.ref(xml_id, raise_if_not_found=False)
+            if cron:
+                cron.sudo()._trigger()
+
+    @api.model
+    def _cron_process_chunks(self):
+        """Traiter les lots en attente un par un, avec un commit par lot.
+
+        Chaque cron de MASS_JOB_CRONS exécute cette méthode : les lots sont traités
+        en parallèle, chaque worker réservant le prochain lot libre par FOR UPDATE
+        SKIP LOCKED jusqu'à son commit. Le résultat et l'état du lot sont enregistrés
+        dans la même transaction que les allocations, si bien qu'un job interrompu
+        reprend aux lots non validés sans double allocation.
+        """
+        testing = getattr(threading.current_thread(), 'testing', False)
+        deadline = time.monotonic() + CRON_TIME_BUDGET
+        while time.monotonic() < deadline:
+            self.env.cr.execute("""
+                SELECT id
+                  FROM hr_leave_allocation_mass_job_chunk
+                 WHERE state = 'pending'
+                 ORDER BY job_id, sequence
+                 LIMIT 1
+                   FOR UPDATE SKIP LOCKED
+            """)
+            row = self.env.cr.fetchone()
+            if not row:
+                return
+            self.env['hr.leave.allocation.mass.job.chunk'].browse(row[0])._process()
+            if not testing:
+                self.env.cr.commit()
+        # Budget de temps épuisé : replanifier immédiatement la suite
+        self._trigger_workers()
+
+
+class HrLeaveAllocationMassJobChunk(models.Model):
+    _name = 'hr.leave.allocation.mass.job.chunk'
+    _description = 'Mass Leave Allocation Job Chunk'
+    _order = 'job_id, sequence'
+
+    job_id = fields.Many2one('hr.leave.allocation.mass.job', required=True, ondelete='cascade', index=True)
+    sequence = fields.Integer(string="Lot", required=True)
+    employee_ids = fields.Many2many('hr.employee', string="Employés")
+    state = fields.Selection([
+        ('pending', 'En attente'),
+        ('done', 'Traité'),
+        ('failed', 'En échec'),
+    ], string="État", default='pending', required=True, index=True)
+    created_count = fields.Integer(string="Créées")
+    updated_count = fields.Integer(string="Mises à jour")
+    failed_count = fields.Integer(string="Échecs")
+    error = fields.Text(string="Erreurs")
+
+    def _process(self):
+        self.ensure_one()
+        job = self.job_id
+        try:
+            with self.env.cr.savepoint():
+                results = self.env['hr.leave.allocation']._mass_allocate(
+                    self.employee_ids,
+                    job.holiday_status_id,
+                    job.number_of_days,
+                    f'Allocation massive - {job.holiday_status_id.name}',
+                    rule=job.allocation_rule_id,
+                )
+        except Exception as e:
+            _logger.exception("Échec du lot %s du job d'allocation %s", self.sequence, job.id)
+            self.write({'state': 'failed', 'error': str(e)})
+            return
+
+        statuses = [status for status, message in results.values()]
+        failures = {employee_id: message for employee_id, (status, message) in results.items() if status == 'failed'}
+        self.write({
+            'state': 'done',
+            'created_count': statuses.count('created'),
+            'updated_count': statuses.count('updated'),
+            'failed_count': len(failures),
+            'error': '\n'.join(
+                f'{employee.name} : {failures[employee.id]}'
+                for employee in self.env['hr.employee'].browse(list(failures))
+            ) or False,
+        })
@@ -0,0 +1,217 @@
+import logging
+import threading
+import time
+from datetime import date
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+
+from .hr_leave_allocation_mass_job import CRON_TIME_BUDGET
+from .timeoff_perf_stat import profiled
+
+_logger = logging.getLogger(__name__)
+
+
+class HrLeaveAllocationRollover(models.Model):
+    _name = 'hr.leave.allocation.rollover'
+    _description = 'Yearly Leave Allocation Rollover'
+    _order = 'year desc'
+    _rec_name = 'year'
+
+    year = fields.Integer(string="Année", required=True,
+                          default=lambda self: fields.Date.today().year)
+    state = fields.Selection([
+        ('pending', 'En attente'),
+        ('running', 'En cours'),
+        ('done', 'Terminé'),
+    ], string="État", default='pending', required=True, readonly=True)
+    last_employee_id = fields.Integer(string="Dernier employé traité", readonly=True)
+    employee_count = fields.Integer(string="Employés traités", readonly=True)
+    closed_count = fields.Integer(string="Allocations clôturées", readonly=True)
+    created_count = fields.Integer(string="Allocations créées", readonly=True)
+    carried_days = fields.Float(string="Jours reportés", readonly=True)
+    date_done = fields.Datetime(string="Terminé le", readonly=True)
+
+    _sql_constraints = [
+        ('year_uniq', 'unique(year)', "Un seul renouvellement par année."),
+    ]
+
+    @api.model
+    def _cron_rollover(self):
+        """Créer le renouvellement de l'année en cours s'il n'existe pas, puis traiter
+        les renouvellements en attente par lots, avec un commit par lot.
+
+        La progression (dernier employé traité) est enregistrée avec chaque lot : un
+        passage interrompu reprend là où il s'était arrêté, et les insertions étant
+        idempotentes, rejouer un lot ne crée pas de doublon.
+        """
+        year = fields.Date.today().year
+        if not self.search_count([('year', '=', year)]):
+            self.create({'year': year})
+        testing = getattr(threading.current_thread(), 'testing', False)
+        deadline = time.monotonic() + CRON_TIME_BUDGET
+        for rollover in self.search([('state', '!=', 'done')], order='year'):
+            while rollover.state != 'done':
+                if time.monotonic() >= deadline:
+                    # Budget de temps épuisé : replanifier immédiatement la suite
+                    self.env.ref('timeoff.ir_cron_leave_allocation_rollover').sudo()._trigger()
+                    return
+                rollover._process_next_chunk()
+                if not testing:
+                    self.env.cr.commit()
+
+    def action_start(self):
+        if self.filtered(lambda rollover: rollover.state == 'done'):
+            raise UserError(_("Ce renouvellement est déjà terminé."))
+        self.env.ref('timeoff.ir_cron_leave_allocation_rollover').sudo()._trigger()
+
+    @profiled
+    def _process_next_chunk(self):
+        """Renouveler les allocations du lot d'employés suivant (pagination par id)."""
+        self.ensure_one()
+        chunk_size = int(self.env['ir.config_parameter'].sudo().get_param(
+            'timeoff.mass_allocation_chunk_size', 500))
+        self.env['hr.employee'].flush_model(['department_id', 'active'])
+        self.env.cr.execute("""
+            SELECT e.id
+              FROM hr_employee e
+             WHERE e.active
+               AND e.id > %s
+               AND EXISTS (
+                       SELECT 1
+                         FROM hr_department_hr_leave_allocation_rule_rel rel
+                         JOIN hr_leave_allocation_rule r ON r.id = rel.hr_leave_allocation_rule_id
+                        WHERE rel.hr_department_id = e.department_id
+                          AND r.active
+                   )
+             ORDER BY e.id
+             LIMIT %s
+        """, (self.last_employee_id, chunk_size))
+        employee_ids = [row[0] for row in self.env.cr.fetchall()]
+        if not employee_ids:
+            self.write({'state': 'done', 'date_done': fields.Datetime.now()})
+            return
+
+        closed_count = self._close_previous_allocations(employee_ids)
+        created_count, carried_days = self._create_year_allocations(employee_ids)
+        self.write({
+            'state': 'running',
+            'last_employee_id': employee_ids[-1],
+            'employee_count': self.employee_count + len(employee_ids),
+            'closed_count': self.closed_count + closed_count,
+            'created_count': self.created_count + created_count,
+            'carried_days': self.carried_days + carried_days,
+        })
+
+    def _close_previous_allocations(self, employee_ids):
+        """Borner au 31 décembre précédent les allocations de règles encore ouvertes."""
+        Allocation = self.env['hr.leave.allocation'].sudo()
+        Allocation.flush_model(['date_from', 'date_to', 'allocation_rule_id'])
+        year_start = date(self.year, 1, 1)
+        self.env.cr.execute("""
+            UPDATE hr_leave_allocation
+               SET date_to = %(previous_year_end)s,
+                   write_uid = %(uid)s,
+                   write_date = NOW() AT TIME ZONE 'UTC'
+             WHERE employee_id = ANY(%(employee_ids)s)
+               AND allocation_rule_id IS NOT NULL
+               AND date_from < %(year_start)s
+               AND (date_to IS NULL OR date_to >= %(year_start)s)
+            RETURNING id
+        """, {
+            'previous_year_end': date(self.year - 1, 12, 31),
+            'year_start': year_start,
+            'uid': self.env.uid,
+            'employee_ids': employee_ids,
+        })
+        allocations = Allocation.browse([row[0] for row in self.env.cr.fetchall()])
+        allocations.invalidate_recordset(['date_to', 'write_uid', 'write_date'])
+        allocations.modified(['date_to'])
+        return len(allocations)
+
+    def _create_year_allocations(self, employee_ids):
+        """Créer les allocations de l'année pour toutes les règles actives, en une requête.
+
+        Le report correspond au solde de l'année précédente du type : jours alloués
+        sur la période moins jours pris d'après hr.leave.usage.summary, plafonné
+        par carry_over_max_days. Il est ajouté aux jours de la règle et conservé dans
+        carried_over_days.
+
+        :return: (nombre d'allocations créées, jours reportés)
+        """
+        Allocation = self.env['hr.leave.allocation'].sudo()
+        Allocation.flush_model()
+        self.env['hr.leave.usage.summary'].flush_model()
+        rules = self.env['hr.leave.allocation.rule'].sudo().search([('active', '=', True)])
+        leave_types = rules.holiday_status_id
+        self.env.cr.execute("""
+            WITH inserted AS (
+                INSERT INTO hr_leave_allocation
+                       (private_name, employee_id, holiday_status_id, allocation_rule_id, allocation_origin,
+                        number_of_days, carried_over_days, state, date_from, date_to, allocation_type, active,
+                        create_uid, write_uid, create_date, write_date)
+                SELECT 'Auto-allocation - ' || type_names.name, e.id, r.holiday_status_id, r.id, 'rule',
+                       r.number_of_days + carry.days, carry.days,
+                       'validate', %(year_start)s, %(year_end)s, 'regular', TRUE,
+                       %(uid)s, %(uid)s, NOW() AT TIME ZONE 'UTC', NOW() AT TIME ZONE 'UTC'
+                  FROM hr_employee e
+                  JOIN hr_department_hr_leave_allocation_rule_rel rel ON rel.hr_department_id = e.department_id
+                  JOIN hr_leave_allocation_rule r ON r.id = rel.hr_leave_allocation_rule_id AND r.active
+                  JOIN unnest(%(type_ids)s::int[], %(type_names)s::varchar[]) AS type_names(id, name)
+                    ON type_names.id = r.holiday_status_id
+                  LEFT JOIN LATERAL (
+                       SELECT SUM(a.number_of_days) AS allocated
+                         FROM hr_leave_allocation a
+                        WHERE a.employee_id = e.id
+                          AND a.holiday_status_id = r.holiday_status_id
+                          AND a.state = 'validate'
+                          AND a.date_from <= %(previous_year_end)s
+                          AND (a.date_to IS NULL OR a.date_to >= %(previous_year_start)s)
+                  ) previous ON TRUE
+                  LEFT JOIN hr_leave_usage_summary usage
+                    ON usage.employee_id = e.id
+                   AND usage.holiday_status_id = r.holiday_status_id
+                   AND usage.year = %(previous_year)s
+                 CROSS JOIN LATERAL (
+                       SELECT LEAST(
+                                  GREATEST(COALESCE(previous.allocated, 0) - COALESCE(usage.number_of_days, 0), 0),
+                                  COALESCE(r.carry_over_max_days, 0)
+                              ) AS days
+                  ) carry
+                 WHERE e.id = ANY(%(employee_ids)s)
+                   AND NOT EXISTS (
+                           SELECT 1
+                             FROM hr_leave_allocation c
+                            WHERE c.employee_id = e.id
+                              AND c.holiday_status_id = r.holiday_status_id
+                              AND c.state IN ('validate', 'confirm')
+                              AND c.date_from <= %(year_start)s
+                              AND (c.date_to IS NULL OR c.date_to >= %(year_start)s)
+                              AND (c.allocation_rule_id IS NULL OR c.allocation_rule_id <> r.id)
+                       )
+                ON CONFLICT (employee_id, holiday_status_id, allocation_rule_id, (EXTRACT(YEAR FROM date_from)))
+                   WHERE allocation_rule_id IS NOT NULL
+                   DO NOTHING
+                RETURNING id, carried_over_days
+            )
+            SELECT COALESCE(ARRAY_AGG(id), '{}'), COALESCE(SUM(carried_over_days), 0)
+              FROM inserted
+        """, {
+            'type_ids': leave_types.ids,
+            'type_names': leave_types.mapped('name'),
+            'year_start': date(self.year, 1, 1),
+            'year_end': date(self.year, 12, 31),
+            'previous_year': self.year - 1,
+            'previous_year_start': date(self.year - 1, 1, 1),
+            'previous_year_end': date(self.year - 1, 12, 31),
+            'uid': self.env.uid,
+            'employee_ids': employee_ids,
+        })
+        allocation_ids, carried_days = self.env.cr.fetchone()
+        allocations = Allocation.browse(allocation_ids)
+        allocations._mark_inserted_for_compute([
+            'private_name', 'employee_id', 'holiday_status_id', 'allocation_rule_id', 'allocation_origin',
+            'number_of_days', 'carried_over_days', 'state', 'date_from', 'date_to', 'allocation_type', 'active',
+        ])
+        _logger.info("Renouvellement %s : %d allocation(s) créée(s)", self.year, len(allocations))
+        return len(allocations), carried_days
@@ -1,4 +1,6 @@
-from odoo import api, fields, models, _
+from odoo import api, fields, models, tools, _
+from odoo.tools import date_utils
+from .timeoff_perf_stat import profiled
 
 class HrLeaveAllocationRule(models.Model):
     _name = 'hr.leave.allocation.rule'
@@ -8,58 +10,209 @@ class HrLeaveAllocationRule(models.Model):
     holiday_status_id = fields.Many2one('hr.leave.type', string='Leave Type', required=True)
     department_ids = fields.Many2many('hr.department', string='Departments')
     number_of_days = fields.Float(string='Number of Days', required=True)
+    carry_over_max_days = fields.Float(
+        string='Report maximum (jours)',
+        help="Jours non pris reportés sur l'année suivante lors du renouvellement annuel, dans cette limite.")
     active = fields.Boolean(string='Active', default=True)
     
+    @api.model_create_multi
+    def create(self, vals_list):
+        rules = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return rules
+
+    def write(self, vals):
+        result = super().write(vals)
+        self.env.registry.clear_cache()
+        return result
+
+    def unlink(self):
+        result = super().unlink()
+        self.env.registry.clear_cache()
+        return result
+
+    @api.model
+    @tools.ormcache()
+    def _get_rules_by_department(self):
+        """Règles actives par département, chargées une fois par registre.
+
+        L'invalidation passe par registry.clear_cache(), propagée aux autres
+        workers par la signalisation des caches du registre.
+
+        :return: dict {department_id: ((rule_id, holiday_status_id, number_of_days), ...)}
+        """
+        rules_by_department = {}
+        for rule in self.sudo().search([('active', '=', True)]):
+            for department_id in rule.department_ids.ids:
+                rules_by_department.setdefault(department_id, []).append(
+                    (rule.id, rule.holiday_status_id.id, rule.number_of_days)
+                )
+        return {department_id: tuple(rules) for department_id, rules in rules_by_department.items()}
+
+    @profiled
     def apply_to_employee(self, employee):
         """Appliquer cette règle à un employé spécifique"""
-        if not self.active or not employee.department_id or employee.department_id.id not in self.department_ids.ids:
-            return False
-            
-       
-        existing_allocation = self.env['hr.leave.allocation'].sudo().search([
-            ('employee_id', '=', employee.id),
-            ('holiday_status_id', '=', self.holiday_status_id.id),
-            ('state', 'in', ['validate', 'confirm', 'draft']),  # Inclure tous les états
-            ('date_from', '<=', fields.Date.today()),
-            ('date_to', '>=', fields.Date.today()),
-        ], limit=1)
-        
-        if existing_allocation:
-            return False
-            
-        auto_allocation = self.env['hr.leave.allocation'].sudo().search([
-            ('employee_id', '=', employee.id),
-            ('holiday_status_id', '=', self.holiday_status_id.id),
-            ('name', 'ilike', f'Auto-allocation - {self.holiday_status_id.name}'),
-        ], limit=1)
-        
-        if auto_allocation:
-            return False
-            
-
-        try:
-            self.env.cr.execute("""
-                INSERT INTO hr_leave_allocation 
-                (name, employee_id, holiday_status_id, number_of_days, state, 
-                 date_from, date_to, create_date, write_date, create_uid, write_uid, allocation_type)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, NOW(), NOW(), %s, %s, %s)
-            """, (
-                f'Auto-allocation - {self.holiday_status_id.name}',
-                employee.id,
-                self.holiday_status_id.id,
-                self.number_of_days,
-                'validate',
-                #fields.Date.today(),
-                #fields.Date.today().replace(year=fields.Date.today().year + 1),
-                self.env.uid,
-                self.env.uid,
-                'regular'
+        return bool(self.apply_to_employees(employee))
+
+    @profiled
+    def apply_to_employees(self, employees):
+        """Appliquer les règles de self aux employés de leurs départements, en bloc.
+
+        Ne valide jamais la transaction de l'appelant : les doublons éventuels entre
+        transactions concurrentes sont écartés par l'index unique
+        (employee_id, holiday_status_id, allocation_rule_id, année de début) et ON CONFLICT DO NOTHING.
+
+        :return: allocations créées
+        """
+        allocations = self.env['hr.leave.allocation']
+        for rule in self.filtered('active'):
+            targets = employees.filtered(lambda employee: employee.department_id in rule.department_ids)
+            allocations |= self._insert_auto_allocations(
+                rule.id, rule.holiday_status_id, rule.number_of_days, targets.ids
+            )
+        return allocations
+
+    @api.model
+    def _insert_auto_allocations(self, rule_id, leave_type, number_of_days, employee_ids):
+        """Insérer en une requête les allocations automatiques d'une règle.
+
+        Les allocations courent jusqu'à la fin de l'année et sont renouvelées par
+        hr.leave.allocation.rollover. Sont ignorés les employés ayant déjà une
+        allocation en cours pour ce type, ou une allocation de l'année issue de la
+        même règle (index unique, y compris face à une transaction concurrente).
+        """
+        Allocation = self.env['hr.leave.allocation'].sudo()
+        if not employee_ids:
+            return Allocation
+        Allocation.flush_model()
+        today = fields.Date.today()
+        name = f'Auto-allocation - {leave_type.name}'
+        self.env.cr.execute("""
+            INSERT INTO hr_leave_allocation
+                   (private_name, employee_id, holiday_status_id, allocation_rule_id, allocation_origin,
+                    number_of_days, state, date_from, date_to, allocation_type, active,
+                    create_uid, write_uid, create_date, write_date)
+            SELECT %(name)s, e.id, %(type_id)s, %(rule_id)s, 'rule',
+                   %(days)s, 'validate', %(today)s, %(year_end)s, 'regular', TRUE,
+                   %(uid)s, %(uid)s, NOW() AT TIME ZONE 'UTC', NOW() AT TIME ZONE 'UTC'
+              FROM hr_employee e
+             WHERE e.id = ANY(%(employee_ids)s)
+               AND NOT EXISTS (
+                       SELECT 1
+                         FROM hr_leave_allocation a
+                        WHERE a.employee_id = e.id
+                          AND a.holiday_status_id = %(type_id)s
+                          AND a.state IN ('validate', 'confirm')
+                          AND a.date_from <= %(today)s AND (a.date_to IS NULL OR a.date_to >= %(today)s)
+                   )
+            ON CONFLICT (employee_id, holiday_status_id, allocation_rule_id, (EXTRACT(YEAR FROM date_from)))
+               WHERE allocation_rule_id IS NOT NULL
+               DO NOTHING
+            RETURNING id
+        """, {
+            'name': name,
+            'type_id': leave_type.id,
+            'rule_id': rule_id,
+            'days': number_of_days,
+            'today': today,
+            'year_end': date_utils.end_of(today, 'year'),
+            'uid': self.env.uid,
+            'employee_ids': list(employee_ids),
+        })
+        allocations = Allocation.browse([row[0] for row in self.env.cr.fetchall()])
+        allocations._mark_inserted_for_compute([
+            'private_name', 'employee_id', 'holiday_status_id', 'allocation_rule_id', 'allocation_origin',
+            'number_of_days', 'state', 'date_from', 'date_to', 'allocation_type', 'active',
+        ])
+        return allocations
+
+    def _get_application_diff(self):
+        """Écart entre la règle et les allocations de l'année des employés de ses départements.
+
+        Une seule requête ensembliste, quel que soit le nombre d'employés. Seules les
+        allocations créées par la règle sont comparées : celles de l'allocation
+        massive qui lui sont rattachées gardent leurs jours.
+
+        :return: dict {department_id: {'employee_count': n,
+                                       'missing_employee_ids': [...],
+                                       'mismatched_allocation_ids': [...]}}
+        """
+        self.ensure_one()
+        self.env['hr.leave.allocation'].flush_model()
+        self.env['hr.employee'].flush_model(['department_id', 'active'])
+        today = fields.Date.today()
+        self.env.cr.execute("""
+            SELECT e.department_id,
+                   COUNT(*),
+                   COALESCE(ARRAY_AGG(e.id ORDER BY e.id) FILTER (
+                       WHERE a.id IS NULL AND NOT EXISTS (
+                           SELECT 1
+                             FROM hr_leave_allocation c
+                            WHERE c.employee_id = e.id
+                              AND c.holiday_status_id = %(type_id)s
+                              AND c.state IN ('validate', 'confirm')
+                              AND c.date_from <= %(today)s AND (c.date_to IS NULL OR c.date_to >= %(today)s)
+                       )
+                   ), '{}'),
+                   COALESCE(ARRAY_AGG(a.id ORDER BY a.id) FILTER (
+                       WHERE a.state IN ('validate', 'confirm')
+                         AND a.number_of_days <> %(days)s + COALESCE(a.carried_over_days, 0)
+                   ), '{}')
+              FROM hr_employee e
+              JOIN hr_department_hr_leave_allocation_rule_rel rel
+                ON rel.hr_department_id = e.department_id AND rel.hr_leave_allocation_rule_id = %(rule_id)s
+         LEFT JOIN hr_leave_allocation a
+                ON a.employee_id = e.id
+               AND a.holiday_status_id = %(type_id)s
+               AND a.allocation_rule_id = %(rule_id)s
+               AND a.allocation_origin = 'rule'
+               AND EXTRACT(YEAR FROM a.date_from) = %(year)s
+             WHERE e.active
+             GROUP BY e.department_id
+        """, {
+            'rule_id': self.id,
+            'type_id': self.holiday_status_id.id,
+            'days': self.number_of_days,
+            'today': today,
+            'year': today.year,
+        })
+        return {
+            department_id: {
+                'employee_count': employee_count,
+                'missing_employee_ids': missing_ids,
+                'mismatched_allocation_ids': mismatched_ids,
+            }
+            for department_id, employee_count, missing_ids, mismatched_ids in self.env.cr.fetchall()
+        }
+
+    @profiled
+    def _apply_to_existing_employees(self):
+        """Aligner les employés existants sur la règle, par lots de taille fixe.
+
+        Les allocations manquantes sont insérées et les allocations issues de la
+        règle dont le nombre de jours diffère sont mises à jour, une requête par lot ;
+        les jours reportés par le renouvellement annuel sont conservés.
+
+        :return: (nombre d'allocations créées, nombre d'allocations mises à jour)
+        """
+        self.ensure_one()
+        chunk_size = int(self.env['ir.config_parameter'].sudo().get_param(
+            'timeoff.mass_allocation_chunk_size', 500))
+        diff = self._get_application_diff()
+        missing_ids = [employee_id for values in diff.values() for employee_id in values['missing_employee_ids']]
+        mismatched_ids = [
+            allocation_id for values in diff.values() for allocation_id in values['mismatched_allocation_ids']
+        ]
+
+        created = 0
+        for start in range(0, len(missing_ids), chunk_size):
+            created += len(self._insert_auto_allocations(
+                self.id, self.holiday_status_id, self.number_of_days, missing_ids[start:start + chunk_size]
             ))
-            
-
-            self.env.cr.commit()
-            return True
-            
-        except Exception as e:
-            self.env.cr.rollback()
-            return False
\ No newline at end of file
+        Allocation = self.env['hr.leave.allocation'].sudo()
+        for start in range(0, len(mismatched_ids), chunk_size):
+            Allocation._set_number_of_days({
+                allocation.id: self.number_of_days + allocation.carried_over_days
+                for allocation in Allocation.browse(mismatched_ids[start:start + chunk_size])
+            })
+        return created, len(mismatched_ids)
@@ -0,0 +1,268 @@
+import logging
+import threading
+import time
+
+from odoo import api, fields, models
+from odoo.tools import SQL
+
+from .hr_leave_allocation_mass_job import CRON_TIME_BUDGET
+
+_logger = logging.getLogger(__name__)
+
+# États des enregistrements clos, seuls déplacés dans les archives
+ARCHIVE_STATES = ('refuse', 'validate')
+
+
+def _ensure_year_partitions(cr, table, years):
+    """Créer au besoin les partitions annuelles d'une table d'archive."""
+    for year in years:
+        cr.execute(SQL(
+            "CREATE TABLE IF NOT EXISTS %s PARTITION OF %s FOR VALUES FROM (%s) TO (%s)",
+            SQL.identifier(f'{table}_y{year}'),
+            SQL.identifier(table),
+            f'{year}-01-01',
+            f'{year + 1}-01-01',
+        ))
+
+
+def _move_mail_records(cr, model, archive_model, res_ids):
+    """Rattacher le chatter (demandes, approbations, refus et leur suivi) aux
+    enregistrements archivés, qui gardent le même identifiant ; abonnés et activités,
+    sans objet sur un enregistrement clos, sont supprimés."""
+    cr.execute(
+        "UPDATE mail_message SET model = %s WHERE model = %s AND res_id = ANY(%s)",
+        (archive_model, model, res_ids),
+    )
+    for table in ('mail_followers', 'mail_activity'):
+        cr.execute(SQL(
+            "DELETE FROM %s WHERE res_model = %s AND res_id = ANY(%s)",
+            SQL.identifier(table), model, res_ids,
+        ))
+
+
+def _move_attachments(cr, model, archive_model, res_ids):
+    """Rattacher les pièces jointes (justificatifs) aux enregistrements archivés,
+    qui gardent le même identifiant : elles restent consultables et conservées."""
+    cr.execute(
+        "UPDATE ir_attachment SET res_model = %s WHERE res_model = %s AND res_id = ANY(%s)",
+        (archive_model, model, res_ids),
+    )
+
+
+def _archive_cutoff(env):
+    """Premier jour de la période conservée dans les tables courantes : par défaut
+    (timeoff.archive_horizon_years = 1), l'année en cours et la précédente."""
+    horizon = int(env['ir.config_parameter'].sudo().get_param('timeoff.archive_horizon_years', 1))
+    return fields.Date.today().replace(year=fields.Date.today().year - horizon, month=1, day=1)
+
+
+class HrLeaveArchive(models.Model):
+    _name = 'hr.leave.archive'
+    _description = 'Archived Time Off'
+    _auto = False
+    _order = 'request_date_from desc, id desc'
+
+    employee_id = fields.Many2one('hr.employee', string="Employé", readonly=True)
+    holiday_status_id = fields.Many2one('hr.leave.type', string="Type de congé", readonly=True)
+    department_id = fields.Many2one('hr.department', string="Département", readonly=True)
+    private_name = fields.Char(string="Description", readonly=True)
+    state = fields.Selection([
+        ('refuse', 'Refusé'),
+        ('validate', 'Approuvé'),
+    ], string="État", readonly=True)
+    request_date_from = fields.Date(string="Du", readonly=True)
+    request_date_to = fields.Date(string="Au", readonly=True)
+    number_of_days = fields.Float(string="Jours", readonly=True)
+    refuse_reason = fields.Text(string="Raison du refus", readonly=True)
+    first_approver_id = fields.Many2one('hr.employee', string="Premier approbateur", readonly=True)
+    second_approver_id = fields.Many2one('hr.employee', string="Second approbateur", readonly=True)
+    archive_date = fields.Datetime(string="Archivé le", readonly=True)
+    message_ids = fields.One2many('mail.message', 'res_id', string="Historique", readonly=True,
+                                  domain=lambda self: [('model', '=', self._name)])
+
+    def init(self):
+        # Table partitionnée par année de début : la clé de partition fait partie de la clé primaire
+        self.env.cr.execute("""
+            CREATE TABLE IF NOT EXISTS hr_leave_archive (
+                id integer NOT NULL,
+                employee_id integer,
+                holiday_status_id integer,
+                department_id integer,
+                private_name varchar,
+                state varchar,
+                request_date_from date NOT NULL,
+                request_date_to date,
+                number_of_days double precision,
+                refuse_reason text,
+                first_approver_id integer,
+                second_approver_id integer,
+                archive_date timestamp DEFAULT (NOW() AT TIME ZONE 'UTC'),
+                PRIMARY KEY (id, request_date_from)
+            ) PARTITION BY RANGE (request_date_from);
+            CREATE INDEX IF NOT EXISTS hr_leave_archive_employee_type_idx
+                ON hr_leave_archive (employee_id, holiday_status_id, request_date_from);
+        """)
+
+    @api.model
+    def _cron_archive(self):
+        """Déplacer par lots les congés et allocations clos antérieurs à l'horizon.
+
+        Chaque lot est un unique DELETE ... RETURNING / INSERT validé à part : un
+        passage interrompu reprend simplement avec les enregistrements restants.
+        """
+        testing = getattr(threading.current_thread(), 'testing', False)
+        deadline = time.monotonic() + CRON_TIME_BUDGET
+        cutoff = _archive_cutoff(self.env)
+        for archive_chunk in (self._archive_leaves_chunk, self.env['hr.leave.allocation.archive']._archive_chunk):
+            while True:
+                if time.monotonic() >= deadline:
+                    # Budget de temps épuisé : replanifier immédiatement la suite
+                    self.env.ref('timeoff.ir_cron_leave_archive').sudo()._trigger()
+                    return
+                if not archive_chunk(cutoff):
+                    break
+                if not testing:
+                    self.env.cr.commit()
+
+    @api.model
+    def _archive_leaves_chunk(self, cutoff):
+        """Archiver un lot de congés clos se terminant avant cutoff.
+
+        Un congé validé reste en place tant qu'une allocation validée toujours
+        ouverte (non archivée) du même employé et du même type chevauche ses dates :
+        Odoo calcule les jours pris et les soldes de l'allocation à partir de hr.leave.
+
+        :return: nombre de congés archivés
+        """
+        chunk_size = int(self.env['ir.config_parameter'].sudo().get_param('timeoff.archive_chunk_size', 5000))
+        self.env['hr.leave'].flush_model()
+        self.env['hr.leave.allocation'].flush_model(
+            ['employee_id', 'holiday_status_id', 'state', 'date_from', 'date_to'])
+        cr = self.env.cr
+        cr.execute("""
+            SELECT l.id, EXTRACT(YEAR FROM l.request_date_from)::int
+              FROM hr_leave l
+             WHERE l.state IN %(states)s
+               AND l.request_date_to < %(cutoff)s
+               AND l.request_date_from IS NOT NULL
+               AND (l.state = 'refuse' OR NOT EXISTS (
+                       SELECT 1
+                         FROM hr_leave_allocation a
+                        WHERE a.employee_id = l.employee_id
+                          AND a.holiday_status_id = l.holiday_status_id
+                          AND a.state = 'validate'
+                          AND a.date_from <= l.request_date_to
+                          AND (a.date_to IS NULL OR a.date_to >= l.request_date_from)
+                          AND (a.date_to IS NULL OR a.date_to >= %(cutoff)s)
+                   ))
+             ORDER BY l.id
+             LIMIT %(limit)s
+               FOR UPDATE OF l SKIP LOCKED
+        """, {'states': ARCHIVE_STATES, 'cutoff': cutoff, 'limit': chunk_size})
+        rows = cr.fetchall()
+        if not rows:
+            return 0
+        leave_ids = [leave_id for leave_id, year in rows]
+        _ensure_year_partitions(cr, 'hr_leave_archive', {year for leave_id, year in rows})
+        cr.execute("""
+            WITH moved AS (
+                DELETE FROM hr_leave
+                 WHERE id = ANY(%s)
+             RETURNING id, employee_id, holiday_status_id, department_id, private_name, state,
+                       request_date_from, request_date_to, number_of_days, refuse_reason,
+                       first_approver_id, second_approver_id
+            )
+            INSERT INTO hr_leave_archive
+                   (id, employee_id, holiday_status_id, department_id, private_name, state,
+                    request_date_from, request_date_to, number_of_days, refuse_reason,
+                    first_approver_id, second_approver_id)
+            SELECT * FROM moved
+        """, (leave_ids,))
+        _move_mail_records(cr, 'hr.leave', 'hr.leave.archive', leave_ids)
+        _move_attachments(cr, 'hr.leave', 'hr.leave.archive', leave_ids)
+        self.env.invalidate_all()
+        _logger.info("%d congé(s) archivé(s)", len(leave_ids))
+        return len(leave_ids)
+
+
+class HrLeaveAllocationArchive(models.Model):
+    _name = 'hr.leave.allocation.archive'
+    _description = 'Archived Time Off Allocation'
+    _auto = False
+    _order = 'date_from desc, id desc'
+
+    employee_id = fields.Many2one('hr.employee', string="Employé", readonly=True)
+    holiday_status_id = fields.Many2one('hr.leave.type', string="Type de congé", readonly=True)
+    allocation_rule_id = fields.Many2one('hr.leave.allocation.rule', string="Règle d'allocation", readonly=True)
+    private_name = fields.Char(string="Description", readonly=True)
+    state = fields.Selection([
+        ('refuse', 'Refusée'),
+        ('validate', 'Approuvée'),
+    ], string="État", readonly=True)
+    date_from = fields.Date(string="Du", readonly=True)
+    date_to = fields.Date(string="Au", readonly=True)
+    number_of_days = fields.Float(string="Jours", readonly=True)
+    archive_date = fields.Datetime(string="Archivé le", readonly=True)
+    message_ids = fields.One2many('mail.message', 'res_id', string="Historique", readonly=True,
+                                  domain=lambda self: [('model', '=', self._name)])
+
+    def init(self):
+        self.env.cr.execute("""
+            CREATE TABLE IF NOT EXISTS hr_leave_allocation_archive (
+                id integer NOT NULL,
+                employee_id integer,
+                holiday_status_id integer,
+                allocation_rule_id integer,
+                private_name varchar,
+                state varchar,
+                date_from date NOT NULL,
+                date_to date,
+                number_of_days double precision,
+                archive_date timestamp DEFAULT (NOW() AT TIME ZONE 'UTC'),
+                PRIMARY KEY (id, date_from)
+            ) PARTITION BY RANGE (date_from);
+            CREATE INDEX IF NOT EXISTS hr_leave_allocation_archive_employee_type_idx
+                ON hr_leave_allocation_archive (employee_id, holiday_status_id, date_from);
+        """)
+
+    @api.model
+    def _archive_chunk(self, cutoff):
+        """Archiver un lot d'allocations closes ayant pris fin avant cutoff.
+
+        :return: nombre d'allocations archivées
+        """
+        chunk_size = int(self.env['ir.config_parameter'].sudo().get_param('timeoff.archive_chunk_size', 5000))
+        self.env['hr.leave.allocation'].flush_model()
+        cr = self.env.cr
+        cr.execute("""
+            SELECT id, EXTRACT(YEAR FROM date_from)::int
+              FROM hr_leave_allocation
+             WHERE state IN %s
+               AND date_to < %s
+               AND date_from IS NOT NULL
+             ORDER BY id
+             LIMIT %s
+               FOR UPDATE SKIP LOCKED
+        """, (ARCHIVE_STATES, cutoff, chunk_size))
+        rows = cr.fetchall()
+        if not rows:
+            return 0
+        allocation_ids = [allocation_id for allocation_id, year in rows]
+        _ensure_year_partitions(cr, 'hr_leave_allocation_archive', {year for allocation_id, year in rows})
+        cr.execute("""
+            WITH moved AS (
+                DELETE FROM hr_leave_allocation
+                 WHERE id = ANY(%s)
+             RETURNING id, employee_id, holiday_status_id, allocation_rule_id, private_name, state,
+                       date_from, date_to, number_of_days
+            )
+            INSERT INTO hr_leave_allocation_archive
+                   (id, employee_id, holiday_status_id, allocation_rule_id, private_name, state,
+                    date_from, date_to, number_of_days)
+            SELECT * FROM moved
+        """, (allocation_ids,))
+        _move_mail_records(cr, 'hr.leave.allocation', 'hr.leave.allocation.archive', allocation_ids)
+        _move_attachments(cr, 'hr.leave.allocation', 'hr.leave.allocation.archive', allocation_ids)
+        self.env.invalidate_all()
+        _logger.info("%d allocation(s) archivée(s)", len(allocation_ids))
+        return len(allocation_ids)
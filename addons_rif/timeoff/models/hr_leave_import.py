@@ -0,0 +1,221 @@
+import csv
+import logging
+from bisect import bisect_right
+from collections import defaultdict
+from itertools import islice
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+from odoo.tools import float_compare
+
+from .hr_leave import QUOTA_STATES, split_days_by_year
+from .timeoff_perf_stat import profiled
+
+_logger = logging.getLogger(__name__)
+
+REQUIRED_COLUMNS = ('employee', 'leave_type', 'date_from', 'date_to')
+IMPORT_STATES = ('confirm', 'validate', 'refuse')
+
+
+class HrLeaveImport(models.AbstractModel):
+    _name = 'hr.leave.import'
+    _description = 'Leave Requests CSV Import'
+
+    @api.model
+    @profiled
+    def _import_csv(self, stream, rejected_stream, chunk_size=None, delimiter=','):
+        """Importer des congés depuis un flux CSV, par lots de taille fixe.
+
+        Colonnes : employee (matricule), leave_type (nom du type), date_from et
+        date_to (AAAA-MM-JJ) ; facultatives : number_of_days, description, state
+        (confirm, validate ou refuse ; validate par défaut).
+
+        Chaque lot est contrôlé en bloc (employés, types, couverture des allocations,
+        quotas annuels) puis créé sans notification ni suivi. Les lignes refusées sont
+        écrites au fur et à mesure dans rejected_stream avec leur motif ; seul le lot
+        courant est gardé en mémoire.
+
+        :return: dict {'imported': n, 'rejected': n}
+        """
+        chunk_size = chunk_size or int(self.env['ir.config_parameter'].sudo().get_param(
+            'timeoff.leave_import_chunk_size', 1000))
+        reader = csv.DictReader(stream, delimiter=delimiter)
+        missing_columns = [column for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or [])]
+        if missing_columns:
+            raise UserError(_("Colonnes manquantes dans le fichier : %s", ', '.join(missing_columns)))
+        rejected_writer = csv.DictWriter(rejected_stream, fieldnames=[*reader.fieldnames, 'error'],
+                                         delimiter=delimiter, extrasaction='ignore')
+        rejected_writer.writeheader()
+
+        leave_types = {
+            leave_type['name']: leave_type
+            for leave_type in self.env['hr.leave.type'].with_context(active_test=False).search_read(
+                [], ['name', 'requires_allocation'])
+        }
+        counts = {'imported': 0, 'rejected': 0}
+        while True:
+            rows = list(islice(reader, chunk_size))
+            if not rows:
+                break
+            candidates, rejected = self._check_chunk(rows, leave_types)
+            imported, failed = self._create_chunk(candidates)
+            rejected += failed
+            for row, error in rejected:
+                rejected_writer.writerow({**row, 'error': error})
+            counts['imported'] += imported
+            counts['rejected'] += len(rejected)
+            # Mémoire constante : rien ne reste en cache d'un lot à l'autre
+            self.env.invalidate_all()
+        _logger.info("Import de congés : %(imported)d importé(s), %(rejected)d rejeté(s)", counts)
+        return counts
+
+    @api.model
+    def _parse_row(self, row, leave_types):
+        leave_type = leave_types.get((row.get('leave_type') or '').strip())
+        if not leave_type:
+            raise ValueError(_("Type de congé inconnu : %s", row.get('leave_type')))
+        date_from = fields.Date.to_date((row.get('date_from') or '').strip())
+        date_to = fields.Date.to_date((row.get('date_to') or '').strip())
+        if not date_from or not date_to or date_to < date_from:
+            raise ValueError(_("Période invalide."))
+        state = (row.get('state') or '').strip() or 'validate'
+        if state not in IMPORT_STATES:
+            raise ValueError(_("État inconnu : %s", state))
+        number_of_days = (row.get('number_of_days') or '').strip()
+        values = {
+            'holiday_status_id': leave_type['id'],
+            'request_date_from': date_from,
+            'request_date_to': date_to,
+            'state': state,
+        }
+        if number_of_days:
+            values['number_of_days'] = float(number_of_days.replace(',', '.'))
+        if row.get('description'):
+            values['name'] = row['description']
+        return values
+
+    @api.model
+    def _check_chunk(self, rows, leave_types):
+        """Contrôler un lot de lignes en quelques requêtes.
+
+        :return: (liste de (ligne, valeurs) acceptées, liste de (ligne, motif) rejetées)
+        """
+        rejected = []
+        parsed = []
+        for row in rows:
+            try:
+                parsed.append((row, self._parse_row(row, leave_types)))
+            except ValueError as e:
+                rejected.append((row, str(e)))
+
+        references = {(row.get('employee') or '').strip() for row, values in parsed}
+        employees = {
+            employee['identification_id']: employee
+            for employee in self.env['hr.employee'].with_context(active_test=False).search_read(
+                [('identification_id', 'in', list(references))],
+                ['identification_id', 'department_id', 'company_id'])
+        }
+        candidates = []
+        for row, values in parsed:
+            employee = employees.get((row.get('employee') or '').strip())
+            if not employee:
+                rejected.append((row, _("Employé inconnu : %s", row.get('employee'))))
+                continue
+            values['employee_id'] = employee['id']
+            candidates.append((row, values, employee))
+
+        Leave = self.env['hr.leave']
+        windows = Leave._get_allocation_windows(
+            employee_ids={values['employee_id'] for row, values, employee in candidates},
+            type_ids={values['holiday_status_id'] for row, values, employee in candidates},
+        )
+        Policy = self.env['hr.leave.quota.policy']
+        days_by_candidate = [
+            split_days_by_year(
+                values['request_date_from'],
+                values['request_date_to'],
+                values.get('number_of_days', (values['request_date_to'] - values['request_date_from']).days + 1),
+            ) if values['state'] in QUOTA_STATES else {}
+            for row, values, employee in candidates
+        ]
+        usage = defaultdict(float, self.env['hr.leave.usage.summary'].sudo()._get_usage({
+            (values['employee_id'], values['holiday_status_id'], year)
+            for (row, values, employee), days_by_year in zip(candidates, days_by_candidate)
+            for year in days_by_year
+        }))
+
+        accepted = []
+        requires_allocation = {leave_type['id'] for leave_type in leave_types.values()
+                               if leave_type['requires_allocation'] == 'yes'}
+        for (row, values, employee), days_by_year in zip(candidates, days_by_candidate):
+            key = (values['employee_id'], values['holiday_status_id'])
+            if values['holiday_status_id'] in requires_allocation and values['state'] != 'refuse':
+                starts, ends = windows.get(key, ([], []))
+                index = bisect_right(starts, values['request_date_from']) - 1
+                if index < 0 or ends[index] < values['request_date_to']:
+                    rejected.append((row, _("Aucune allocation ne couvre la période.")))
+                    continue
+            max_days = Policy._get_max_days(
+                values['holiday_status_id'],
+                employee['department_id'] and employee['department_id'][0],
+                employee['company_id'] and employee['company_id'][0],
+            ) if days_by_year else None
+            if max_days is not None and any(
+                float_compare(usage[(*key, year)] + days, max_days, precision_digits=2) > 0
+                for year, days in days_by_year.items()
+            ):
+                rejected.append((row, _("Quota annuel de %g jours dépassé.", max_days)))
+                continue
+            for year, days in days_by_year.items():
+                usage[(*key, year)] += days
+            accepted.append((row, values))
+        return accepted, rejected
+
+    @api.model
+    def _create_chunk(self, candidates):
+        """Créer les congés d'un lot en un create, sans notification, suivi ni activité.
+
+        Les congés importés comme validés sont approuvés par l'utilisateur courant et
+        bloquent le calendrier de l'employé, comme après action_validate : leurs
+        absences de ressource sont créées en un lot. En cas d'échec du lot, les
+        lignes sont rejouées une à une pour isoler les erreurs.
+
+        :return: (nombre de congés créés, liste de (ligne, motif) rejetées)
+        """
+        if not candidates:
+            return 0, []
+        approver_id = self.env.user.employee_id.id
+        for row, values in candidates:
+            if values['state'] == 'validate':
+                values['first_approver_id'] = approver_id
+        try:
+            with self.env.cr.savepoint():
+                self._create_leaves([values for row, values in candidates])
+            return len(candidates), []
+        except Exception:
+            _logger.info("Échec de l'import du lot, reprise ligne par ligne", exc_info=True)
+
+        imported, rejected = 0, []
+        for row, values in candidates:
+            try:
+                with self.env.cr.savepoint():
+                    self._create_leaves([values])
+                imported += 1
+            except Exception as e:
+                rejected.append((row, str(e)))
+        return imported, rejected
+
+    @api.model
+    def _create_leaves(self, vals_list):
+        leaves = self.env['hr.leave'].with_context(
+            timeoff_skip_notification=True,
+            leave_fast_create=True,
+            leave_skip_state_check=True,
+            tracking_disable=True,
+            mail_create_nolog=True,
+            mail_notrack=True,
+            mail_activity_automation_skip=True,
+        ).create(vals_list)
+        leaves.filtered(lambda leave: leave.state == 'validate')._create_resource_leave()
+        self.env.flush_all()
+        return leaves
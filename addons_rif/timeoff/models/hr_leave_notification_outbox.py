@@ -0,0 +1,124 @@
+import logging
+import threading
+from datetime import timedelta
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+# Nombre de tentatives avant de laisser une notification en échec
+MAX_ATTEMPTS = 3
+# Délai avant la première nouvelle tentative, doublé à chaque échec
+RETRY_DELAY = timedelta(minutes=5)
+
+
+class HrLeaveNotificationOutbox(models.Model):
+    _name = 'hr.leave.notification.outbox'
+    _description = 'Leave Notification Outbox'
+    _order = 'id'
+
+    leave_id = fields.Many2one('hr.leave', string="Congé", required=True, ondelete='cascade')
+    partner_id = fields.Many2one('res.partner', string="Destinataire", ondelete='cascade')
+    author_id = fields.Many2one('res.partner', string="Auteur", ondelete='set null')
+    body = fields.Text(string="Message", required=True)
+    state = fields.Selection([
+        ('pending', 'En attente'),
+        ('failed', 'En échec'),
+    ], string="État", default='pending', required=True, index=True)
+    attempts = fields.Integer(string="Tentatives", default=0)
+    next_attempt = fields.Datetime(string="Prochaine tentative", index=True)
+    error = fields.Text(string="Erreur")
+
+    @api.model
+    def _enqueue(self, values_list):
+        """Enregistrer des notifications à envoyer après la transaction et réveiller le cron."""
+        if not values_list:
+            return self
+        author_id = self.env.user.partner_id.id
+        entries = self.sudo().create([{'author_id': author_id, **values} for values in values_list])
+        self.env.ref('timeoff.ir_cron_leave_notification_outbox').sudo()._trigger()
+        return entries
+
+    @api.model
+    def _cron_process_outbox(self):
+        """Vider la file par lots, chaque lot étant validé séparément.
+
+        Odoo n'exécute jamais deux instances d'un même cron : la file est vidée par
+        un seul worker, et FOR UPDATE SKIP LOCKED évite seulement d'attendre une
+        entrée verrouillée par une autre transaction (relance manuelle). Un lot en
+        échec est rejoué entrée par entrée, de sorte que seules les entrées fautives
+        consomment une tentative ; elles sont reprises après un délai croissant.
+        """
+        batch_size = int(self.env['ir.config_parameter'].sudo().get_param(
+            'timeoff.notification_outbox_batch_size', 200))
+        retry_at = []
+        while True:
+            self.env.cr.execute("""
+                SELECT id
+                  FROM hr_leave_notification_outbox
+                 WHERE state = 'pending'
+                   AND (next_attempt IS NULL OR next_attempt <= NOW() AT TIME ZONE 'UTC')
+                 ORDER BY id
+                 LIMIT %s
+                   FOR UPDATE SKIP LOCKED
+            """, (batch_size,))
+            entries = self.browse([row[0] for row in self.env.cr.fetchall()])
+            if not entries:
+                break
+
+            try:
+                with self.env.cr.savepoint():
+                    entries._send()
+                sent_ids = entries.ids
+            except Exception:
+                _logger.info("Échec de l'envoi groupé de %d notification(s) de congé, reprise une à une",
+                             len(entries), exc_info=True)
+                sent_ids = []
+                for entry in entries:
+                    try:
+                        with self.env.cr.savepoint():
+                            entry._send()
+                        sent_ids.append(entry.id)
+                    except Exception as e:
+                        _logger.exception("Échec de l'envoi de la notification de congé %s", entry.id)
+                        retry_at += entry._record_failure(e)
+            if sent_ids:
+                self.env.cr.execute("DELETE FROM hr_leave_notification_outbox WHERE id IN %s", (tuple(sent_ids),))
+                self.invalidate_model()
+
+            if not getattr(threading.current_thread(), 'testing', False):
+                self.env.cr.commit()
+        if retry_at:
+            self.env.ref('timeoff.ir_cron_leave_notification_outbox').sudo()._trigger(at=min(retry_at))
+
+    def _record_failure(self, error):
+        """Compter une tentative en échec et planifier la suivante.
+
+        :return: liste contenant la date de la prochaine tentative, vide si l'entrée
+            est abandonnée
+        """
+        self.ensure_one()
+        attempts = self.attempts + 1
+        next_attempt = fields.Datetime.now() + RETRY_DELAY * 2 ** (attempts - 1)
+        failed = attempts >= MAX_ATTEMPTS
+        self.write({
+            'attempts': attempts,
+            'state': 'failed' if failed else 'pending',
+            'next_attempt': False if failed else next_attempt,
+            'error': str(error),
+        })
+        return [] if failed else [next_attempt]
+
+    def _send(self):
+        """Publier les messages de la file dans le chatter des congés : création
+        groupée, puis notification des destinataires message par message."""
+        self.env['hr.leave'].with_context(tracking_disable=True, mail_notrack=True)._message_post_batch([{
+            'res_id': entry.leave_id.id,
+            'body': entry.body,
+            'partner_ids': entry.partner_id.ids,
+            'author_id': entry.author_id.id,
+        } for entry in self])
+
+    def action_retry(self):
+        self.write({'state': 'pending', 'attempts': 0, 'next_attempt': False, 'error': False})
+        self.env.ref('timeoff.ir_cron_leave_notification_outbox').sudo()._trigger()
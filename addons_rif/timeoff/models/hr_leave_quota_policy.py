@@ -0,0 +1,62 @@
+from odoo import api, fields, models, tools
+
+
+class HrLeaveQuotaPolicy(models.Model):
+    _name = 'hr.leave.quota.policy'
+    _description = 'Leave Quota Policy'
+    _order = 'holiday_status_id, department_id, company_id'
+
+    name = fields.Char(string="Nom", required=True)
+    holiday_status_id = fields.Many2one('hr.leave.type', string="Type de congé", required=True, ondelete='cascade')
+    max_days = fields.Float(string="Jours maximum par année", required=True)
+    department_id = fields.Many2one('hr.department', string="Département",
+                                    help="Laisser vide pour appliquer la politique à tous les départements.")
+    company_id = fields.Many2one('res.company', string="Société",
+                                 help="Laisser vide pour appliquer la politique à toutes les sociétés.")
+    active = fields.Boolean(string="Actif", default=True)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        policies = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return policies
+
+    def write(self, vals):
+        result = super().write(vals)
+        self.env.registry.clear_cache()
+        return result
+
+    def unlink(self):
+        result = super().unlink()
+        self.env.registry.clear_cache()
+        return result
+
+    @api.model
+    @tools.ormcache()
+    def _get_compiled_policies(self):
+        """Politiques actives compilées par type de congé, de la plus spécifique à la plus générale.
+
+        :return: dict {holiday_status_id: ((department_id, company_id, max_days), ...)}
+        """
+        policies = {}
+        for policy in self.sudo().search_read([], ['holiday_status_id', 'department_id', 'company_id', 'max_days']):
+            policies.setdefault(policy['holiday_status_id'][0], []).append((
+                policy['department_id'] and policy['department_id'][0],
+                policy['company_id'] and policy['company_id'][0],
+                policy['max_days'],
+            ))
+        return {
+            type_id: tuple(sorted(scoped, key=lambda p: (not p[0], not p[1])))
+            for type_id, scoped in policies.items()
+        }
+
+    @api.model
+    def _get_max_days(self, holiday_status_id, department_id, company_id):
+        """Limite applicable à un type de congé pour un département et une société, ou None."""
+        for policy_department_id, policy_company_id, max_days in self._get_compiled_policies().get(holiday_status_id, ()):
+            if policy_department_id and policy_department_id != department_id:
+                continue
+            if policy_company_id and policy_company_id != company_id:
+                continue
+            return max_days
+        return None
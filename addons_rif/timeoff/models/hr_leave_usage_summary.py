@@ -0,0 +1,199 @@
+import logging
+
+from odoo import api, fields, models, _
+from odoo.tools import SQL, float_compare, table_exists
+
+from .hr_leave import QUOTA_STATES
+
+_logger = logging.getLogger(__name__)
+
+
+class HrLeaveUsageSummary(models.Model):
+    _name = 'hr.leave.usage.summary'
+    _description = 'Leave Usage Summary'
+    _order = 'year desc, employee_id, holiday_status_id'
+
+    employee_id = fields.Many2one('hr.employee', string="Employé", required=True, ondelete='cascade', readonly=True)
+    holiday_status_id = fields.Many2one('hr.leave.type', string="Type de congé", required=True, ondelete='cascade', readonly=True)
+    year = fields.Integer(string="Année", required=True, readonly=True)
+    number_of_days = fields.Float(string="Jours consommés", readonly=True)
+
+    _sql_constraints = [
+        ('employee_type_year_uniq', 'unique(employee_id, holiday_status_id, year)',
+         "Une seule ligne de consommation par employé, type de congé et année."),
+    ]
+
+    def init(self):
+        # Alimenter le registre à l'installation à partir des congés existants
+        self.env.cr.execute("SELECT 1 FROM hr_leave_usage_summary LIMIT 1")
+        if not self.env.cr.fetchone():
+            self._apply_deltas(self._compute_live_usage())
+
+    @api.model
+    def _apply_deltas(self, deltas):
+        """Ajouter les variations {(employee_id, holiday_status_id, year): jours} au registre."""
+        self._upsert({key: days for key, days in deltas.items() if days}, increment=True)
+
+    @api.model
+    def _refresh_usage(self, keys):
+        """Recalculer depuis les congés les lignes de keys, en valeurs absolues : une
+        même modification peut être rejouée (création puis validation automatique,
+        recalcul de la durée) sans être comptée deux fois."""
+        if not keys:
+            return
+        live = self._compute_live_usage(keys)
+        self._upsert({key: live.get(key, 0.0) for key in keys}, increment=False)
+
+    @api.model
+    def _refresh_pending_usage(self):
+        """Précommit : recalculer les clés dont la durée a été recalculée hors write."""
+        self.sudo()._refresh_usage(self.env.cr.precommit.data.pop('timeoff.usage_summary_keys', set()))
+
+    @api.model
+    def _upsert(self, values, increment):
+        if not values:
+            return
+        keys = list(values)
+        self.env.cr.execute(SQL(
+            """
+            INSERT INTO hr_leave_usage_summary
+                   (employee_id, holiday_status_id, year, number_of_days,
+                    create_uid, write_uid, create_date, write_date)
+            SELECT d.employee_id, d.holiday_status_id, d.year, d.number_of_days,
+                   %(uid)s, %(uid)s, NOW() AT TIME ZONE 'UTC', NOW() AT TIME ZONE 'UTC'
+              FROM unnest(%(employee_ids)s::int[], %(type_ids)s::int[], %(years)s::int[], %(days)s::float[])
+                   AS d(employee_id, holiday_status_id, year, number_of_days)
+            ON CONFLICT (employee_id, holiday_status_id, year) DO UPDATE
+               SET number_of_days = %(number_of_days)s,
+                   write_uid = EXCLUDED.write_uid,
+                   write_date = EXCLUDED.write_date
+            """,
+            uid=self.env.uid,
+            employee_ids=[key[0] for key in keys],
+            type_ids=[key[1] for key in keys],
+            years=[key[2] for key in keys],
+            days=[values[key] for key in keys],
+            number_of_days=SQL("hr_leave_usage_summary.number_of_days + EXCLUDED.number_of_days")
+            if increment else SQL("EXCLUDED.number_of_days"),
+        ))
+        self.invalidate_model(['number_of_days'])
+
+    @api.model
+    def _get_usage(self, keys):
+        """Lire les jours consommés pour un ensemble de clés (employee_id, holiday_status_id, year)."""
+        if not keys:
+            return {}
+        keys = list(keys)
+        self.env.cr.execute("""
+            SELECT s.employee_id, s.holiday_status_id, s.year, s.number_of_days
+              FROM hr_leave_usage_summary s
+              JOIN unnest(%s::int[], %s::int[], %s::int[]) AS k(employee_id, holiday_status_id, year)
+                ON k.employee_id = s.employee_id
+               AND k.holiday_status_id = s.holiday_status_id
+               AND k.year = s.year
+        """, (
+            [key[0] for key in keys],
+            [key[1] for key in keys],
+            [key[2] for key in keys],
+        ))
+        return {(employee_id, type_id, year): days for employee_id, type_id, year, days in self.env.cr.fetchall()}
+
+    @api.model
+    def _compute_live_usage(self, keys=None):
+        """Recalculer la consommation depuis hr_leave et ses archives, au prorata des
+        jours par année civile ; limitée aux clés (employee_id, holiday_status_id, year)
+        de keys si fourni."""
+        self.env['hr.leave'].flush_model([
+            'employee_id', 'holiday_status_id', 'state', 'number_of_days',
+            'request_date_from', 'request_date_to',
+        ])
+        key_filter = key_join = SQL()
+        if keys is not None:
+            keys = list(keys)
+            employee_ids, type_ids, years = ([key[index] for key in keys] for index in range(3))
+            key_filter = SQL(
+                "WHERE employee_id = ANY(%s) AND holiday_status_id = ANY(%s)",
+                sorted(set(employee_ids)), sorted(set(type_ids)),
+            )
+            key_join = SQL("""
+                JOIN unnest(%s::int[], %s::int[], %s::int[]) AS k(employee_id, holiday_status_id, year)
+                  ON k.employee_id = l.employee_id AND k.holiday_status_id = l.holiday_status_id AND k.year = y.year
+            """, employee_ids, type_ids, years)
+        leaves = SQL("""(
+            SELECT employee_id, holiday_status_id, state, number_of_days, request_date_from, request_date_to
+              FROM hr_leave %s
+        )""", key_filter)
+        # La table d'archive n'existe pas encore lors de l'initialisation du module
+        if table_exists(self.env.cr, 'hr_leave_archive'):
+            leaves = SQL("""(
+                SELECT employee_id, holiday_status_id, state, number_of_days, request_date_from, request_date_to
+                  FROM hr_leave %s
+                 UNION ALL
+                SELECT employee_id, holiday_status_id, state, number_of_days, request_date_from, request_date_to
+                  FROM hr_leave_archive %s
+            )""", key_filter, key_filter)
+        self.env.cr.execute(SQL("""
+            SELECT l.employee_id, l.holiday_status_id, y.year,
+                   SUM(l.number_of_days
+                       * ((LEAST(l.request_date_to, make_date(y.year, 12, 31))
+                           - GREATEST(l.request_date_from, make_date(y.year, 1, 1)) + 1)::float
+                          / (l.request_date_to - l.request_date_from + 1)))
+              FROM %s AS l
+             CROSS JOIN LATERAL generate_series(
+                       EXTRACT(YEAR FROM l.request_date_from)::int,
+                       EXTRACT(YEAR FROM l.request_date_to)::int) AS y(year)
+             %s
+             WHERE l.state IN %s
+               AND l.employee_id IS NOT NULL
+             GROUP BY l.employee_id, l.holiday_status_id, y.year
+        """, leaves, key_join, QUOTA_STATES))
+        return {(employee_id, type_id, year): days or 0.0 for employee_id, type_id, year, days in self.env.cr.fetchall()}
+
+    @api.model
+    def rebuild(self, check_only=False):
+        """Comparer le registre aux congés réels et, sauf en mode contrôle, le reconstruire.
+
+        :return: liste des écarts (clé, jours enregistrés, jours réels)
+        """
+        live = self._compute_live_usage()
+        self.env.cr.execute("SELECT employee_id, holiday_status_id, year, number_of_days FROM hr_leave_usage_summary")
+        stored = {(employee_id, type_id, year): days for employee_id, type_id, year, days in self.env.cr.fetchall()}
+
+        drift = [
+            (key, stored.get(key, 0.0), live.get(key, 0.0))
+            for key in stored.keys() | live.keys()
+            if float_compare(stored.get(key, 0.0), live.get(key, 0.0), precision_digits=2)
+        ]
+        if drift:
+            _logger.warning("Registre des consommations de congés : %d écart(s) détecté(s)", len(drift))
+        if not check_only and drift:
+            self.env.cr.execute("DELETE FROM hr_leave_usage_summary")
+            self.invalidate_model()
+            self._apply_deltas(live)
+        return drift
+
+    def action_check_drift(self):
+        drift = self.rebuild(check_only=True)
+        return self._notify_rebuild_result(
+            _("%d écart(s) détecté(s) entre le registre et les congés.") % len(drift) if drift
+            else _("Le registre est cohérent avec les congés."),
+            'warning' if drift else 'success',
+        )
+
+    def action_rebuild(self):
+        drift = self.rebuild()
+        return self._notify_rebuild_result(
+            _("Registre reconstruit, %d écart(s) corrigé(s).") % len(drift),
+            'success',
+        )
+
+    def _notify_rebuild_result(self, message, notification_type):
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Registre des consommations'),
+                'message': message,
+                'type': notification_type,
+            }
+        }
@@ -0,0 +1,141 @@
+import functools
+import logging
+import os
+import threading
+import time
+
+from odoo import api, fields, models
+from odoo.tools import config
+
+_logger = logging.getLogger(__name__)
+
+# Instrumentation activée par `timeoff_profiling = True` dans la configuration
+# Odoo ou la variable d'environnement TIMEOFF_PROFILING=1. Désactivée, le
+# décorateur renvoie la méthode d'origine : aucun surcoût à l'exécution.
+PROFILING_ENABLED = str(
+    os.environ.get('TIMEOFF_PROFILING') or config.get('timeoff_profiling') or ''
+).lower() in ('1', 'true', 'yes')
+# Délai minimum entre deux enregistrements des statistiques d'un worker
+FLUSH_INTERVAL = 60
+
+_stats_lock = threading.Lock()
+_stats = {}
+_last_flush = [time.monotonic()]
+
+
+def profiled(func):
+    """Décorateur comptant appels, requêtes SQL, temps SQL et temps Python par méthode.
+
+    Les statistiques sont agrégées en mémoire par worker puis enregistrées
+    périodiquement dans timeoff.perf.stat.
+    """
+    if not PROFILING_ENABLED:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        thread = threading.current_thread()
+        cr = self.env.cr
+        queries_before = cr.sql_log_count
+        sql_time_before = getattr(thread, 'query_time', 0.0)
+        start = time.perf_counter()
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            duration = time.perf_counter() - start
+            sql_time = getattr(thread, 'query_time', 0.0) - sql_time_before
+            _record(
+                f'{self._name}.{func.__name__}',
+                cr.sql_log_count - queries_before,
+                sql_time,
+                max(duration - sql_time, 0.0),
+            )
+            if time.monotonic() - _last_flush[0] > FLUSH_INTERVAL:
+                self.env['timeoff.perf.stat']._flush_worker_stats()
+    return wrapper
+
+
+def _record(method, queries, sql_time, python_time):
+    with _stats_lock:
+        stat = _stats.setdefault(method, [0, 0, 0.0, 0.0])
+        stat[0] += 1
+        stat[1] += queries
+        stat[2] += sql_time
+        stat[3] += python_time
+
+
+class TimeoffPerfStat(models.Model):
+    _name = 'timeoff.perf.stat'
+    _description = 'TimeOff Performance Statistics'
+    _order = 'python_time desc'
+    _rec_name = 'method'
+
+    method = fields.Char(string="Méthode", required=True, readonly=True)
+    worker_pid = fields.Integer(string="Worker (PID)", readonly=True)
+    call_count = fields.Integer(string="Appels", readonly=True)
+    query_count = fields.Integer(string="Requêtes SQL", readonly=True)
+    sql_time = fields.Float(string="Temps SQL (s)", readonly=True, digits=(16, 4))
+    python_time = fields.Float(string="Temps Python (s)", readonly=True, digits=(16, 4))
+    avg_query_count = fields.Float(string="Requêtes / appel", compute='_compute_averages', digits=(16, 1))
+    avg_time = fields.Float(string="Temps / appel (s)", compute='_compute_averages', digits=(16, 4))
+
+    _sql_constraints = [
+        ('method_worker_uniq', 'unique(method, worker_pid)', "Une ligne par méthode et par worker."),
+    ]
+
+    @api.depends('call_count', 'query_count', 'sql_time', 'python_time')
+    def _compute_averages(self):
+        for stat in self:
+            calls = stat.call_count or 1
+            stat.avg_query_count = stat.query_count / calls
+            stat.avg_time = (stat.sql_time + stat.python_time) / calls
+
+    @api.model
+    def _flush_worker_stats(self):
+        """Ajouter les statistiques en mémoire du worker à la table, dans un curseur séparé."""
+        with _stats_lock:
+            stats = dict(_stats)
+            _stats.clear()
+            _last_flush[0] = time.monotonic()
+        if not stats:
+            return
+        methods = list(stats)
+        try:
+            with self.env.registry.cursor() as cr:
+                cr.execute("""
+                    INSERT INTO timeoff_perf_stat
+                           (method, worker_pid, call_count, query_count, sql_time, python_time,
+                            create_uid, write_uid, create_date, write_date)
+                    SELECT s.method, %(pid)s, s.call_count, s.query_count, s.sql_time, s.python_time,
+                           %(uid)s, %(uid)s, NOW() AT TIME ZONE 'UTC', NOW() AT TIME ZONE 'UTC'
+                      FROM unnest(%(methods)s::varchar[], %(calls)s::int[], %(queries)s::int[],
+                                  %(sql_times)s::float[], %(python_times)s::float[])
+                           AS s(method, call_count, query_count, sql_time, python_time)
+                    ON CONFLICT (method, worker_pid) DO UPDATE
+                       SET call_count = timeoff_perf_stat.call_count + EXCLUDED.call_count,
+                           query_count = timeoff_perf_stat.query_count + EXCLUDED.query_count,
+                           sql_time = timeoff_perf_stat.sql_time + EXCLUDED.sql_time,
+                           python_time = timeoff_perf_stat.python_time + EXCLUDED.python_time,
+                           write_date = EXCLUDED.write_date
+                """, {
+                    'pid': os.getpid(),
+                    'uid': self.env.uid,
+                    'methods': methods,
+                    'calls': [stats[method][0] for method in methods],
+                    'queries': [stats[method][1] for method in methods],
+                    'sql_times': [stats[method][2] for method in methods],
+                    'python_times': [stats[method][3] for method in methods],
+                })
+        except Exception:
+            _logger.warning("Impossible d'enregistrer les statistiques de performance timeoff", exc_info=True)
+
+    def action_flush(self):
+        self._flush_worker_stats()
+        return {'type': 'ir.actions.client', 'tag': 'reload'}
+
+    def action_reset(self):
+        with _stats_lock:
+            _stats.clear()
+        self.env.cr.execute("DELETE FROM timeoff_perf_stat")
+        self.invalidate_model()
+        return {'type': 'ir.actions.client', 'tag': 'reload'}
@@ -0,0 +1,6 @@
+from . import test_performance
+from . import test_allocation_rule_concurrency
+from . import test_query_plans
+from . import test_archive_performance
+from . import test_timeoff_checks
+from . import test_timeoff_controllers
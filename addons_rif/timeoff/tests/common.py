@@ -0,0 +1,130 @@
+import json
+import logging
+import os
+import tempfile
+import math
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import date
+
+from odoo.tests.common import TransactionCase
+
+_logger = logging.getLogger(__name__)
+
+
+class TimeoffPerformanceCase(TransactionCase):
+    """Base des benchmarks timeoff : jeux de données par taille, budget de requêtes
+    et rapport JSON des temps mesurés (TIMEOFF_PERF_REPORT pour changer le chemin)."""
+
+    SIZES = (10, 100, 1000, 10000)
+    LEAVE_DATE = date(2030, 1, 7)
+    # L'ORM lit les enregistrements par tranches de cr.IN_MAX identifiants
+    ORM_CHUNK = 1000
+    # Budgets de requêtes par benchmark : (base, par tranche ORM, par enregistrement).
+    # Le terme par enregistrement est réservé aux étapes qu'Odoo traite encore
+    # enregistrement par enregistrement ; il est nul pour les chemins ensemblistes.
+    QUERY_BUDGETS = {}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env = cls.env(context=dict(
+            cls.env.context,
+            tracking_disable=True,
+            mail_create_nolog=True,
+            mail_notrack=True,
+        ))
+        cls.leave_type = cls.env['hr.leave.type'].create({
+            'name': 'Congé benchmark',
+            'requires_allocation': 'no',
+            'leave_validation_type': 'hr',
+            'request_unit': 'day',
+        })
+        cls.allocation_type = cls.env['hr.leave.type'].create({
+            'name': 'Congé benchmark avec allocation',
+            'requires_allocation': 'yes',
+            'leave_validation_type': 'hr',
+            'request_unit': 'day',
+        })
+        cls.measures = []
+
+    @classmethod
+    def tearDownClass(cls):
+        report_path = os.environ.get(
+            'TIMEOFF_PERF_REPORT',
+            os.path.join(tempfile.gettempdir(), 'timeoff_perf_report.json'),
+        )
+        if cls.measures:
+            with open(report_path, 'a', encoding='utf-8') as report:
+                for measure in cls.measures:
+                    report.write(json.dumps(measure) + '\n')
+            _logger.info("Rapport de performance timeoff écrit dans %s", report_path)
+        super().tearDownClass()
+
+    @classmethod
+    def _copy_columns(cls, table, overrides):
+        """Colonnes de table et expressions SELECT recopiant une ligne modèle t, pour
+        générer de gros volumes en SQL ; overrides remplace certaines expressions."""
+        cls.cr.execute("""
+            SELECT column_name
+              FROM information_schema.columns
+             WHERE table_name = %s AND column_name <> 'id'
+        """, (table,))
+        columns = [row[0] for row in cls.cr.fetchall()]
+        return ', '.join(columns), ', '.join(overrides.get(column, f't.{column}') for column in columns)
+
+    def _create_employees(self, size, **values):
+        department = self.env['hr.department'].create({'name': f'Benchmark {size}'})
+        return self.env['hr.employee'].create([{
+            'name': f'Employé benchmark {size}-{index}',
+            'department_id': department.id,
+            **values,
+        } for index in range(size)])
+
+    def _prepare_leave_values(self, employees, leave_type=None):
+        return [{
+            'name': 'Benchmark',
+            'employee_id': employee.id,
+            'holiday_status_id': (leave_type or self.leave_type).id,
+            'request_date_from': self.LEAVE_DATE,
+            'request_date_to': self.LEAVE_DATE,
+        } for employee in employees]
+
+    def _query_budget(self, name, size):
+        base, per_chunk, per_record = self.QUERY_BUDGETS[name]
+        return base + per_chunk * math.ceil(size / self.ORM_CHUNK) + per_record * size
+
+    @contextmanager
+    def benchmark(self, name, size):
+        """Mesurer un bloc (requêtes et durée) et l'ajouter au rapport JSON ; la
+        mesure est renvoyée et complétée à la sortie du bloc. Si name a un budget
+        dans QUERY_BUDGETS, le bloc y est soumis par assertQueryCount."""
+        self.env.flush_all()
+        self.env.invalidate_all()
+        measure = {'benchmark': name, 'size': size}
+        queries_before = self.cr.sql_log_count
+        start = time.perf_counter()
+        budget = self.assertQueryCount(self._query_budget(name, size)) if name in self.QUERY_BUDGETS else nullcontext()
+        with budget:
+            yield measure
+        duration = time.perf_counter() - start
+        measure.update({
+            'queries': self.cr.sql_log_count - queries_before,
+            'seconds': round(duration, 4),
+        })
+        self.measures.append(measure)
+        _logger.info("timeoff benchmark %(benchmark)s[%(size)s]: %(queries)s requêtes, %(seconds)ss", measure)
+
+    def assertQueryGrowth(self, name):
+        """Comparer les mesures de name pour la plus petite et la plus grande taille :
+        la croissance ne dépasse pas celle que permet son budget, c'est-à-dire les
+        tranches supplémentaires lues par l'ORM pour un chemin ensembliste."""
+        measures = sorted((measure for measure in self.measures if measure['benchmark'] == name),
+                          key=lambda measure: measure['size'])
+        small, large = measures[0], measures[-1]
+        allowed = self._query_budget(name, large['size']) - self._query_budget(name, small['size'])
+        self.assertLessEqual(
+            large['queries'] - small['queries'], allowed,
+            f"{name} : {small['queries']} requêtes pour {small['size']} enregistrement(s), "
+            f"{large['queries']} pour {large['size']}",
+        )
@@ -0,0 +1,95 @@
+import threading
+
+from odoo import SUPERUSER_ID, api
+from odoo.modules.registry import Registry
+from odoo.sql_db import db_connect
+from odoo.tests.common import BaseCase, get_db_name, tagged
+
+
+@tagged('-standard', 'timeoff_concurrency', 'post_install', '-at_install')
+class TestAllocationRuleConcurrency(BaseCase):
+    """Applications concurrentes d'une même règle : chaque transaction a son propre
+    curseur et valide ses données, seule l'unicité en base empêche les doublons."""
+
+    WORKERS = 4
+    EMPLOYEES = 50
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.db_name = get_db_name()
+        cls.registry = Registry(cls.db_name)
+        with cls._cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {'tracking_disable': True})
+            department = env['hr.department'].create({'name': 'Concurrence allocation'})
+            leave_type = env['hr.leave.type'].create({
+                'name': 'Congé concurrence',
+                'requires_allocation': 'yes',
+                'request_unit': 'day',
+            })
+            # Règle créée inactive : les employés ne reçoivent rien à leur création
+            rule = env['hr.leave.allocation.rule'].create({
+                'name': 'Règle concurrence',
+                'holiday_status_id': leave_type.id,
+                'department_ids': [(6, 0, department.ids)],
+                'number_of_days': 3,
+                'active': False,
+            })
+            employees = env['hr.employee'].create([{
+                'name': f'Employé concurrence {index}',
+                'department_id': department.id,
+            } for index in range(cls.EMPLOYEES)])
+            rule.active = True
+            cls.department_id, cls.leave_type_id, cls.rule_id = department.id, leave_type.id, rule.id
+            cls.employee_ids = employees.ids
+
+    @classmethod
+    def tearDownClass(cls):
+        with cls._cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            env['hr.leave.allocation'].with_context(active_test=False).search([
+                ('holiday_status_id', '=', cls.leave_type_id),
+            ]).sudo().with_context(allocation_skip_state_check=True).unlink()
+            env['hr.leave.allocation.rule'].browse(cls.rule_id).unlink()
+            env['hr.employee'].browse(cls.employee_ids).unlink()
+            env['hr.leave.type'].browse(cls.leave_type_id).unlink()
+            env['hr.department'].browse(cls.department_id).unlink()
+        super().tearDownClass()
+
+    @classmethod
+    def _cursor(cls):
+        return db_connect(cls.db_name).cursor()
+
+    def test_concurrent_apply_to_employees(self):
+        barrier = threading.Barrier(self.WORKERS)
+        errors = []
+
+        def apply_rule():
+            try:
+                with self._cursor() as cr:
+                    env = api.Environment(cr, SUPERUSER_ID, {})
+                    rule = env['hr.leave.allocation.rule'].browse(self.rule_id)
+                    employees = env['hr.employee'].browse(self.employee_ids)
+                    barrier.wait()
+                    rule.apply_to_employees(employees)
+                    env.flush_all()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=apply_rule) for _ in range(self.WORKERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertFalse(errors)
+        with self._cursor() as cr:
+            cr.execute("""
+                SELECT employee_id, COUNT(*)
+                  FROM hr_leave_allocation
+                 WHERE allocation_rule_id = %s
+                 GROUP BY employee_id
+            """, (self.rule_id,))
+            counts = dict(cr.fetchall())
+        self.assertEqual(set(counts), set(self.employee_ids))
+        self.assertEqual(set(counts.values()), {1}, "Une seule allocation automatique par employé")
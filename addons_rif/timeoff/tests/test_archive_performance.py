@@ -0,0 +1,81 @@
+from datetime import date
+
+from odoo import fields
+from odoo.tests import tagged
+
+from .common import TimeoffPerformanceCase
+
+
+@tagged('-standard', 'timeoff_perf', 'post_install', '-at_install')
+class TestTimeoffArchivePerformance(TimeoffPerformanceCase):
+    """Effet de l'archivage sur les contrôles de congés : HISTORY_YEARS années
+    d'historique par employé sont générées en SQL, puis les contrôles sont mesurés
+    avant et après le passage de l'archiveur."""
+
+    HISTORY_YEARS = 10
+    LEAVES_PER_YEAR = 20
+    QUERY_BUDGETS = {
+        'hr.leave._check_sick_leave_limit[before_archive]': (10, 4, 0),
+        'hr.leave._check_sick_leave_limit[after_archive]': (10, 4, 0),
+    }
+
+    def _seed_history(self, template, employees):
+        rows = len(employees) * self.HISTORY_YEARS * self.LEAVES_PER_YEAR
+        columns, values = self._copy_columns('hr_leave', {
+            'employee_id': '(%(employee_ids)s::int[])[1 + s.i %% %(employee_count)s]',
+            'state': "CASE WHEN s.i %% 5 = 0 THEN 'refuse' ELSE 'validate' END",
+            'request_date_from': "%(start)s::date + (s.i %% (365 * %(years)s))",
+            'request_date_to': "%(start)s::date + (s.i %% (365 * %(years)s))",
+            'date_from': "(%(start)s::date + (s.i %% (365 * %(years)s))) + TIME '08:00'",
+            'date_to': "(%(start)s::date + (s.i %% (365 * %(years)s))) + TIME '17:00'",
+            'meeting_id': 'NULL',
+        })
+        self.cr.execute(f"""
+            INSERT INTO hr_leave ({columns})
+            SELECT {values}
+              FROM hr_leave t, generate_series(1, %(rows)s) AS s(i)
+             WHERE t.id = %(template_id)s
+        """, {
+            'employee_ids': employees.ids,
+            'employee_count': len(employees),
+            # Historique entièrement antérieur à l'horizon d'archivage (année en cours et précédente)
+            'start': date(fields.Date.today().year - 1 - self.HISTORY_YEARS, 1, 1),
+            'years': self.HISTORY_YEARS,
+            'rows': rows,
+            'template_id': template.id,
+        })
+        self.cr.execute("ANALYZE hr_leave")
+        return rows
+
+    def test_checks_before_and_after_archive(self):
+        for size in self.SIZES[:3]:
+            with self.subTest(size=size):
+                employees = self._create_employees(size)
+                # Les allocations d'abord : un congé d'un type à allocation en exige une
+                self.env['hr.leave.allocation'].create([{
+                    'name': 'Benchmark archive',
+                    'employee_id': employee.id,
+                    'holiday_status_id': self.allocation_type.id,
+                    'number_of_days': 30,
+                    'date_from': date(self.LEAVE_DATE.year, 1, 1),
+                } for employee in employees])._approve_created_allocations()
+                leaves = self.env['hr.leave'].create(self._prepare_leave_values(employees, self.allocation_type))
+                self._seed_history(leaves[:1], employees)
+                Usage = self.env['hr.leave.usage.summary']
+                usage_before = {key: round(days, 2) for key, days in Usage._compute_live_usage().items()}
+
+                for label in ('before_archive', 'after_archive'):
+                    if label == 'after_archive':
+                        self.env['hr.leave.archive']._cron_archive()
+                        self.cr.execute("ANALYZE hr_leave")
+                    with self.benchmark(f'hr.leave._check_sick_leave_limit[{label}]', size):
+                        leaves._check_sick_leave_limit()
+                        leaves._check_allocation_period()
+
+                self.cr.execute("SELECT COUNT(*) FROM hr_leave WHERE employee_id = ANY(%s)", (employees.ids,))
+                self.assertEqual(self.cr.fetchone()[0], size, "Seuls les congés récents restent dans hr_leave")
+                usage_after = {key: round(days, 2) for key, days in Usage._compute_live_usage().items()}
+                self.assertEqual(usage_after, usage_before,
+                                 "Les congés archivés restent comptés dans le registre")
+        for label in ('before_archive', 'after_archive'):
+            self.assertQueryGrowth(f'hr.leave._check_sick_leave_limit[{label}]')
@@ -0,0 +1,148 @@
+import io
+
+from odoo.tests import tagged
+
+from .common import TimeoffPerformanceCase
+
+
+@tagged('-standard', 'timeoff_perf', 'post_install', '-at_install')
+class TestTimeoffPerformance(TimeoffPerformanceCase):
+    """Lancer avec --test-tags timeoff_perf. Chaque benchmark est soumis à son budget
+    de requêtes pour toutes les tailles, puis sa croissance entre la plus petite et
+    la plus grande est bornée."""
+
+    QUERY_BUDGETS = {
+        # Un message de demande par congé, notifié par _notify_thread
+        'hr.leave.create': (35, 4, 5),
+        # Un message « fait » par activité d'approbation (activity_feedback)
+        'hr.leave.action_validate': (40, 6, 5),
+        'hr.leave._check_department_capacity': (8, 3, 0),
+        # Message de refus publié et notifié par congé
+        'leave.refuse.wizard.action_refuse': (30, 4, 4),
+        'hr.leave.allocation.mass.wizard.action_allocate': (25, 3, 0),
+        # Contact de travail et ressource créés par Odoo pour chaque employé
+        'hr.employee.create': (35, 6, 2),
+        'hr.leave.import._import_csv': (40, 6, 0),
+        'hr.employee._get_timeoff_balances': (10, 3, 0),
+        'hr.leave._reconcile_activities': (15, 3, 4),
+    }
+
+    def test_leave_create(self):
+        for size in self.SIZES:
+            with self.subTest(size=size):
+                employees = self._create_employees(size)
+                vals_list = self._prepare_leave_values(employees)
+                with self.benchmark('hr.leave.create', size):
+                    self.env['hr.leave'].create(vals_list)
+        self.assertQueryGrowth('hr.leave.create')
+
+    def test_leave_action_validate(self):
+        for size in self.SIZES:
+            with self.subTest(size=size):
+                employees = self._create_employees(size)
+                leaves = self.env['hr.leave'].create(self._prepare_leave_values(employees))
+                with self.benchmark('hr.leave.action_validate', size):
+                    leaves.action_validate()
+        self.assertQueryGrowth('hr.leave.action_validate')
+
+    def test_leave_action_validate_with_department_capacity(self):
+        for size in self.SIZES:
+            with self.subTest(size=size):
+                employees = self._create_employees(size)
+                employees.department_id.max_absence_rate = 100
+                leaves = self.env['hr.leave'].create(self._prepare_leave_values(employees))
+                with self.benchmark('hr.leave._check_department_capacity', size):
+                    leaves._check_department_capacity()
+        self.assertQueryGrowth('hr.leave._check_department_capacity')
+
+    def test_leave_refuse_wizard(self):
+        for size in self.SIZES:
+            with self.subTest(size=size):
+                employees = self._create_employees(size)
+                leaves = self.env['hr.leave'].create(self._prepare_leave_values(employees))
+                wizard = self.env['leave.refuse.wizard'].with_context(
+                    active_model='hr.leave',
+                    active_ids=leaves.ids,
+                ).create({'reason': 'Benchmark'})
+                with self.benchmark('leave.refuse.wizard.action_refuse', size):
+                    wizard.action_refuse()
+        self.assertQueryGrowth('leave.refuse.wizard.action_refuse')
+
+    def test_mass_allocation_wizard(self):
+        for size in self.SIZES:
+            with self.subTest(size=size):
+                employees = self._create_employees(size)
+                wizard = self.env['hr.leave.allocation.mass.wizard'].create({
+                    'holiday_status_id': self.allocation_type.id,
+                    'number_of_days': 5,
+                    'department_ids': [(6, 0, employees.department_id.ids)],
+                    'auto_allocate_new_employees': False,
+                })
+                with self.benchmark('hr.leave.allocation.mass.wizard.action_allocate', size):
+                    wizard.action_allocate()
+        self.assertQueryGrowth('hr.leave.allocation.mass.wizard.action_allocate')
+
+    def test_employee_create_with_allocation_rules(self):
+        for size in self.SIZES:
+            with self.subTest(size=size):
+                department = self.env['hr.department'].create({'name': f'Benchmark règles {size}'})
+                self.env['hr.leave.allocation.rule'].create({
+                    'name': f'Règle benchmark {size}',
+                    'holiday_status_id': self.allocation_type.id,
+                    'department_ids': [(6, 0, department.ids)],
+                    'number_of_days': 10,
+                })
+                vals_list = [{
+                    'name': f'Nouvel employé {size}-{index}',
+                    'department_id': department.id,
+                } for index in range(size)]
+                with self.benchmark('hr.employee.create', size):
+                    self.env['hr.employee'].create(vals_list)
+        self.assertQueryGrowth('hr.employee.create')
+
+    def test_leave_csv_import(self):
+        for size in self.SIZES:
+            with self.subTest(size=size):
+                employees = self._create_employees(size)
+                for employee in employees:
+                    employee.identification_id = f'IMPORT-{employee.id}'
+                stream = io.StringIO('employee,leave_type,date_from,date_to\n' + ''.join(
+                    f'IMPORT-{employee.id},{self.leave_type.name},{self.LEAVE_DATE},{self.LEAVE_DATE}\n'
+                    for employee in employees
+                ))
+                with self.benchmark('hr.leave.import._import_csv', size):
+                    counts = self.env['hr.leave.import']._import_csv(stream, io.StringIO(), chunk_size=size)
+                self.assertEqual(counts, {'imported': size, 'rejected': 0})
+        self.assertQueryGrowth('hr.leave.import._import_csv')
+
+    def test_timeoff_balances(self):
+        for size in self.SIZES:
+            with self.subTest(size=size):
+                employees = self._create_employees(size)
+                self.env['hr.leave'].create(self._prepare_leave_values(employees))
+                with self.benchmark('hr.employee._get_timeoff_balances', size):
+                    employees._get_timeoff_balances_version()
+                    employees._get_timeoff_balances()
+        self.assertQueryGrowth('hr.employee._get_timeoff_balances')
+
+    def test_leave_activity_reconciliation(self):
+        # Référence : activity_update() standard, mesuré sur le même scénario de validation
+        for size in self.SIZES:
+            with self.subTest(size=size):
+                queries = {}
+                for method in ('activity_update', '_reconcile_activities'):
+                    employees = self._create_employees(size)
+                    leaves = self.env['hr.leave'].with_context(mail_activity_automation_skip=True).create(
+                        self._prepare_leave_values(employees))
+                    getattr(leaves, method)()
+                    leaves.with_context(mail_activity_automation_skip=True).action_validate()
+                    with self.benchmark(f'hr.leave.{method}', size) as measure:
+                        getattr(leaves, method)()
+                    queries[method] = measure['queries']
+                    self.assertFalse(self.env['mail.activity'].search([
+                        ('res_model', '=', 'hr.leave'), ('res_id', 'in', leaves.ids),
+                    ]))
+                # Marquage « fait » identique (activity_feedback) : au plus la lecture des
+                # activités ouvertes en plus du chemin standard
+                self.assertLessEqual(queries['_reconcile_activities'], queries['activity_update'] + 1)
+        self.assertQueryGrowth('hr.leave._reconcile_activities')
@@ -0,0 +1,130 @@
+import json
+import os
+
+from odoo.tests import tagged
+
+from .common import TimeoffPerformanceCase
+
+
+@tagged('-standard', 'timeoff_perf', 'post_install', '-at_install')
+class TestTimeoffQueryPlans(TimeoffPerformanceCase):
+    """Vérifier avec EXPLAIN que le planificateur emprunte les index du module sur
+    un volume réaliste (TIMEOFF_EXPLAIN_ROWS congés, 1 000 000 par défaut), inséré
+    en SQL à partir d'un congé modèle."""
+
+    ROWS = int(os.environ.get('TIMEOFF_EXPLAIN_ROWS', 1000000))
+    EMPLOYEES = 1000
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        employees = cls._create_employees(cls, cls.EMPLOYEES)
+        cls.employee = employees[0]
+        template = cls.env['hr.leave'].create(cls._prepare_leave_values(cls, employees[:1]))
+        cls.env['hr.leave.allocation'].create({
+            'name': 'Modèle EXPLAIN',
+            'employee_id': cls.employee.id,
+            'holiday_status_id': cls.allocation_type.id,
+            'number_of_days': 10,
+        })
+        cls.env.flush_all()
+        cls._seed_leaves(template, employees)
+        cls._seed_allocations(employees)
+        cls.cr.execute("ANALYZE hr_leave")
+        cls.cr.execute("ANALYZE hr_leave_allocation")
+
+    @classmethod
+    def _seed_leaves(cls, template, employees):
+        """Congés d'une journée répartis sur les employés, les types, les états et dix ans."""
+        columns, values = cls._copy_columns('hr_leave', {
+            'employee_id': '(%(employee_ids)s::int[])[1 + s.i %% %(employee_count)s]',
+            'holiday_status_id': "CASE WHEN s.i %% 2 = 0 THEN %(type_id)s ELSE %(allocation_type_id)s END",
+            'state': "(ARRAY['confirm', 'validate1', 'validate', 'refuse'])[1 + s.i %% 4]",
+            'request_date_from': "DATE '2020-01-01' + (s.i %% 3650)",
+            'request_date_to': "DATE '2020-01-01' + (s.i %% 3650)",
+            'date_from': "(DATE '2020-01-01' + (s.i %% 3650)) + TIME '08:00'",
+            'date_to': "(DATE '2020-01-01' + (s.i %% 3650)) + TIME '17:00'",
+            'meeting_id': 'NULL',
+        })
+        cls.cr.execute(f"""
+            INSERT INTO hr_leave ({columns})
+            SELECT {values}
+              FROM hr_leave t, generate_series(1, %(rows)s) AS s(i)
+             WHERE t.id = %(template_id)s
+        """, {
+            'employee_ids': employees.ids,
+            'employee_count': len(employees),
+            'type_id': cls.leave_type.id,
+            'allocation_type_id': cls.allocation_type.id,
+            'rows': cls.ROWS,
+            'template_id': template.id,
+        })
+
+    @classmethod
+    def _seed_allocations(cls, employees):
+        columns, values = cls._copy_columns('hr_leave_allocation', {
+            'employee_id': '(%(employee_ids)s::int[])[1 + s.i %% %(employee_count)s]',
+            'state': "(ARRAY['confirm', 'validate', 'refuse'])[1 + s.i %% 3]",
+            'date_from': "make_date(2020 + s.i %% 10, 1, 1)",
+            'date_to': "make_date(2020 + s.i %% 10, 12, 31)",
+            'allocation_rule_id': 'NULL',
+        })
+        cls.cr.execute(f"""
+            INSERT INTO hr_leave_allocation ({columns})
+            SELECT {values}
+              FROM hr_leave_allocation t, generate_series(1, %(rows)s) AS s(i)
+             WHERE t.employee_id = %(employee_id)s
+        """, {
+            'employee_ids': employees.ids,
+            'employee_count': len(employees),
+            'rows': cls.EMPLOYEES * 10,
+            'employee_id': cls.employee.id,
+        })
+
+    def assertPlanUses(self, index_name, query, params):
+        self.cr.execute(f"EXPLAIN (FORMAT JSON) {query}", params)
+        plan = json.dumps(self.cr.fetchone()[0])
+        self.assertIn(f'"Index Name": "{index_name}"', plan,
+                      f"Le plan n'utilise pas {index_name} :\n{plan}")
+
+    def test_validated_leaves_by_employee_and_period(self):
+        # Contrôles de quota et registre de consommation
+        self.assertPlanUses('hr_leave_validated_employee_type_period_idx', """
+            SELECT SUM(number_of_days)
+              FROM hr_leave
+             WHERE employee_id = %s
+               AND holiday_status_id = %s
+               AND state IN ('validate', 'validate1')
+               AND request_date_from <= %s
+               AND request_date_to >= %s
+        """, (self.employee.id, self.leave_type.id, '2025-12-31', '2025-01-01'))
+
+    def test_leaves_by_employee_type_and_state(self):
+        self.assertPlanUses('hr_leave_employee_type_state_idx', """
+            SELECT id
+              FROM hr_leave
+             WHERE employee_id = %s
+               AND holiday_status_id = %s
+               AND state = 'confirm'
+        """, (self.employee.id, self.leave_type.id))
+
+    def test_current_allocations_by_employee_and_period(self):
+        # Fenêtres d'allocation (_get_allocation_windows) et allocations en cours des règles
+        self.assertPlanUses('hr_leave_allocation_current_employee_type_period_idx', """
+            SELECT id
+              FROM hr_leave_allocation
+             WHERE employee_id = %s
+               AND holiday_status_id = %s
+               AND state IN ('validate', 'confirm')
+               AND date_from <= %s
+               AND (date_to IS NULL OR date_to >= %s)
+        """, (self.employee.id, self.allocation_type.id, '2025-06-01', '2025-06-01'))
+
+    def test_allocations_by_employee_and_type(self):
+        # Allocations existantes lues par _apply_allocation_rules_batch et _mass_allocate
+        self.assertPlanUses('hr_leave_allocation_employee_type_state_idx', """
+            SELECT employee_id, holiday_status_id
+              FROM hr_leave_allocation
+             WHERE employee_id = ANY(%s)
+               AND holiday_status_id = %s
+        """, ([self.employee.id], self.allocation_type.id))
@@ -0,0 +1,349 @@
+import csv
+import io
+from datetime import date
+
+from odoo.exceptions import ValidationError
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase, new_test_user
+
+
+@tagged('post_install', '-at_install')
+class TestDepartmentCapacity(TransactionCase):
+
+    LEAVE_DATE = date(2030, 1, 7)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env = cls.env(context=dict(cls.env.context, tracking_disable=True, mail_create_nolog=True))
+        cls.leave_type = cls.env['hr.leave.type'].create({
+            'name': 'Congé capacité',
+            'requires_allocation': 'no',
+            'leave_validation_type': 'hr',
+            'request_unit': 'day',
+        })
+        # Quatre employés à 25 % : un seul absent par jour
+        cls.department = cls.env['hr.department'].create({
+            'name': 'Capacité',
+            'max_absence_rate': 25,
+        })
+        cls.employees = cls.env['hr.employee'].create([{
+            'name': f'Employé capacité {index}',
+            'department_id': cls.department.id,
+        } for index in range(4)])
+
+    def _create_leave(self, employee):
+        return self.env['hr.leave'].create({
+            'name': 'Capacité',
+            'employee_id': employee.id,
+            'holiday_status_id': self.leave_type.id,
+            'request_date_from': self.LEAVE_DATE,
+            'request_date_to': self.LEAVE_DATE,
+        })
+
+    def test_capacity_exceeded_by_validated_leave(self):
+        self._create_leave(self.employees[0]).action_validate()
+        with self.assertRaises(ValidationError):
+            self._create_leave(self.employees[1]).action_validate()
+
+    def test_capacity_exceeded_within_batch(self):
+        leaves = self._create_leave(self.employees[0]) | self._create_leave(self.employees[1])
+        with self.assertRaises(ValidationError):
+            leaves.action_validate()
+
+    def test_capacity_counts_leaves_pending_second_approval(self):
+        self._create_leave(self.employees[0]).with_context(leave_skip_state_check=True).write({'state': 'validate1'})
+        with self.assertRaises(ValidationError):
+            self._create_leave(self.employees[1]).action_validate()
+
+    def test_capacity_ignores_leaves_to_approve(self):
+        self._create_leave(self.employees[0])
+        leave = self._create_leave(self.employees[1])
+        leave.action_validate()
+        self.assertEqual(leave.state, 'validate')
+
+
+@tagged('post_install', '-at_install')
+class TestLeaveImport(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.leave_type = cls.env['hr.leave.type'].create({
+            'name': 'Congé import',
+            'requires_allocation': 'no',
+            'leave_validation_type': 'hr',
+            'request_unit': 'day',
+        })
+        cls.employee = cls.env['hr.employee'].create({
+            'name': 'Employé import',
+            'identification_id': 'IMPORT-TEST-1',
+        })
+
+    def test_import_report(self):
+        stream = io.StringIO(
+            "employee,leave_type,date_from,date_to,state\n"
+            "IMPORT-TEST-1,Congé import,2030-01-07,2030-01-08,validate\n"
+            "IMPORT-INCONNU,Congé import,2030-01-09,2030-01-09,validate\n"
+            "IMPORT-TEST-1,Type inconnu,2030-01-10,2030-01-10,validate\n"
+            "IMPORT-TEST-1,Congé import,2030-01-12,2030-01-11,validate\n"
+            "IMPORT-TEST-1,Congé import,2030-01-14,2030-01-14,annulé\n"
+        )
+        rejected_stream = io.StringIO()
+        counts = self.env['hr.leave.import']._import_csv(stream, rejected_stream)
+        self.assertEqual(counts, {'imported': 1, 'rejected': 4})
+
+        rejected_stream.seek(0)
+        rejected = list(csv.DictReader(rejected_stream))
+        self.assertEqual(
+            [(row['employee'], row['leave_type'], row['date_from']) for row in rejected],
+            [
+                ('IMPORT-TEST-1', 'Type inconnu', '2030-01-10'),
+                ('IMPORT-TEST-1', 'Congé import', '2030-01-12'),
+                ('IMPORT-TEST-1', 'Congé import', '2030-01-14'),
+                ('IMPORT-INCONNU', 'Congé import', '2030-01-09'),
+            ],
+            "Lignes d'origine recopiées, erreurs d'analyse puis de contrôle",
+        )
+        self.assertIn('Type inconnu', rejected[0]['error'])
+        self.assertTrue(rejected[1]['error'])
+        self.assertIn('annulé', rejected[2]['error'])
+        self.assertIn('IMPORT-INCONNU', rejected[3]['error'])
+
+    def test_import_validated_leave_blocks_calendar(self):
+        stream = io.StringIO(
+            "employee,leave_type,date_from,date_to\n"
+            "IMPORT-TEST-1,Congé import,2030-01-07,2030-01-08\n"
+        )
+        self.env['hr.leave.import']._import_csv(stream, io.StringIO())
+        leave = self.env['hr.leave'].search([('employee_id', '=', self.employee.id)])
+        self.assertEqual(leave.state, 'validate')
+        self.assertEqual(leave.first_approver_id, self.env.user.employee_id)
+        self.assertTrue(self.env['resource.calendar.leaves'].search([('holiday_id', '=', leave.id)]),
+                        "Le congé validé importé bloque le calendrier de l'employé")
+
+
+@tagged('post_install', '-at_install')
+class TestLeaveArchive(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env = cls.env(context=dict(cls.env.context, tracking_disable=True, mail_create_nolog=True))
+        cls.employee = cls.env['hr.employee'].create({'name': 'Employé archive'})
+        cls.leave_type = cls.env['hr.leave.type'].create({
+            'name': 'Congé archive',
+            'requires_allocation': 'no',
+            'leave_validation_type': 'hr',
+            'request_unit': 'day',
+        })
+        cls.allocation_type = cls.env['hr.leave.type'].create({
+            'name': 'Congé archive avec allocation',
+            'requires_allocation': 'yes',
+            'leave_validation_type': 'hr',
+            'request_unit': 'day',
+        })
+        # Allocation sans fin : ses jours pris se calculent sur tout l'historique
+        cls.env['hr.leave.allocation'].create({
+            'name': 'Allocation ouverte',
+            'employee_id': cls.employee.id,
+            'holiday_status_id': cls.allocation_type.id,
+            'number_of_days': 100,
+            'date_from': date(2015, 1, 1),
+        })._approve_created_allocations()
+
+    def _create_validated_leave(self, leave_type, day):
+        leave = self.env['hr.leave'].create({
+            'name': 'Archive',
+            'employee_id': self.employee.id,
+            'holiday_status_id': leave_type.id,
+            'request_date_from': day,
+            'request_date_to': day,
+        })
+        leave.action_validate()
+        return leave
+
+    def test_archive_keeps_leaves_of_open_allocations(self):
+        covered_leave = self._create_validated_leave(self.allocation_type, date(2016, 3, 1))
+        free_leave = self._create_validated_leave(self.leave_type, date(2016, 3, 2))
+        attachment = self.env['ir.attachment'].create({
+            'name': 'justificatif.pdf',
+            'raw': b'justificatif',
+            'res_model': 'hr.leave',
+            'res_id': free_leave.id,
+        })
+        message = free_leave.message_post(body="Validé après entretien")
+
+        self.env['hr.leave.archive']._cron_archive()
+
+        self.assertTrue(covered_leave.exists(), "Les jours pris de l'allocation ouverte sont conservés")
+        self.assertFalse(free_leave.exists())
+        self.assertTrue(self.env['hr.leave.archive'].browse(free_leave.id).exists())
+        self.assertEqual((attachment.res_model, attachment.res_id), ('hr.leave.archive', free_leave.id))
+        self.assertIn(message, self.env['hr.leave.archive'].browse(free_leave.id).message_ids,
+                      "Le chatter d'approbation suit le congé archivé")
+
+
+@tagged('post_install', '-at_install')
+class TestUsageSummary(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env = cls.env(context=dict(cls.env.context, tracking_disable=True, mail_create_nolog=True))
+        cls.employee = cls.env['hr.employee'].create({'name': 'Employé registre'})
+        cls.Usage = cls.env['hr.leave.usage.summary']
+
+    def _create_leave(self, validation_type, date_from, date_to):
+        return self.env['hr.leave'].create({
+            'name': 'Registre',
+            'employee_id': self.employee.id,
+            'holiday_status_id': self.env['hr.leave.type'].create({
+                'name': f'Congé registre {validation_type}',
+                'requires_allocation': 'no',
+                'leave_validation_type': validation_type,
+                'request_unit': 'day',
+            }).id,
+            'request_date_from': date_from,
+            'request_date_to': date_to,
+        })
+
+    def _assertLedgerMatchesLeaves(self, leave, expected_days):
+        key = (self.employee.id, leave.holiday_status_id.id, 2030)
+        self.assertAlmostEqual(self.Usage._get_usage({key}).get(key, 0.0), expected_days)
+        self.assertAlmostEqual(self.Usage._compute_live_usage().get(key, 0.0), expected_days)
+        self.assertFalse(self.Usage.rebuild(check_only=True), "Le registre est cohérent avec les congés")
+
+    def test_no_validation_leave_counted_once(self):
+        leave = self._create_leave('no_validation', date(2030, 1, 7), date(2030, 1, 8))
+        self.assertEqual(leave.state, 'validate')
+        self._assertLedgerMatchesLeaves(leave, 2)
+
+    def test_validated_leave_dates_edited(self):
+        leave = self._create_leave('hr', date(2030, 1, 7), date(2030, 1, 8))
+        leave.action_validate()
+        self._assertLedgerMatchesLeaves(leave, 2)
+
+        leave.write({'request_date_from': date(2030, 1, 7), 'request_date_to': date(2030, 1, 11)})
+        self._assertLedgerMatchesLeaves(leave, 5)
+
+        leave.action_refuse()
+        self._assertLedgerMatchesLeaves(leave, 0)
+
+
+@tagged('post_install', '-at_install')
+class TestYearlyQuota(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env = cls.env(context=dict(cls.env.context, tracking_disable=True, mail_create_nolog=True))
+        cls.employee = cls.env['hr.employee'].create({'name': 'Employé quota'})
+        cls.leave_type = cls.env['hr.leave.type'].create({
+            'name': 'Congé quota',
+            'requires_allocation': 'no',
+            'leave_validation_type': 'hr',
+            'request_unit': 'day',
+        })
+        cls.env['hr.leave.quota.policy'].create({
+            'name': 'Cinq jours par an',
+            'holiday_status_id': cls.leave_type.id,
+            'max_days': 5,
+        })
+
+    def _create_leave(self, date_from, date_to):
+        return self.env['hr.leave'].create({
+            'name': 'Quota',
+            'employee_id': self.employee.id,
+            'holiday_status_id': self.leave_type.id,
+            'request_date_from': date_from,
+            'request_date_to': date_to,
+        })
+
+    def test_quota_exceeded_within_batch(self):
+        # Deux congés de trois jours : chacun tient dans le quota, pas les deux
+        leaves = self._create_leave(date(2030, 1, 7), date(2030, 1, 9)) \
+            | self._create_leave(date(2030, 1, 14), date(2030, 1, 16))
+        with self.assertRaises(ValidationError):
+            leaves.action_validate()
+        leaves[0].action_validate()
+        self.assertEqual(leaves[0].state, 'validate')
+
+
+@tagged('post_install', '-at_install')
+class TestApprovalActivities(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env = cls.env(context=dict(cls.env.context, tracking_disable=True, mail_create_nolog=True))
+        cls.approver = new_test_user(cls.env, login='timeoff_approver', groups='hr_holidays.group_hr_holidays_user')
+        cls.leave_type = cls.env['hr.leave.type'].create({
+            'name': 'Congé activités',
+            'requires_allocation': 'no',
+            'leave_validation_type': 'hr',
+            'responsible_ids': [(6, 0, cls.approver.ids)],
+            'request_unit': 'day',
+        })
+        cls.employee = cls.env['hr.employee'].create({'name': 'Employé activités'})
+
+    def test_approver_notified_of_activity(self):
+        leave = self.env['hr.leave'].with_context(mail_activity_automation_skip=True).create({
+            'name': 'Activités',
+            'employee_id': self.employee.id,
+            'holiday_status_id': self.leave_type.id,
+            'request_date_from': date(2030, 1, 7),
+            'request_date_to': date(2030, 1, 7),
+        })
+        leave.with_context(mail_activity_automation_skip=False)._reconcile_activities()
+
+        activity = self.env['mail.activity'].search([('res_model', '=', 'hr.leave'), ('res_id', '=', leave.id)])
+        self.assertEqual(activity.user_id, self.approver)
+        self.assertTrue(self.env['mail.message'].search([
+            ('model', '=', 'hr.leave'),
+            ('res_id', '=', leave.id),
+            ('partner_ids', 'in', self.approver.partner_id.ids),
+        ]), "L'approbateur est notifié de l'activité qui lui est assignée")
+
+
+@tagged('post_install', '-at_install')
+class TestAllocationRuleReapply(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env = cls.env(context=dict(cls.env.context, tracking_disable=True, mail_create_nolog=True))
+        cls.leave_type = cls.env['hr.leave.type'].create({
+            'name': 'Congé règle massive',
+            'requires_allocation': 'yes',
+            'request_unit': 'day',
+        })
+        cls.department = cls.env['hr.department'].create({'name': 'Règle massive'})
+        cls.employee = cls.env['hr.employee'].create({
+            'name': 'Employé règle massive',
+            'department_id': cls.department.id,
+        })
+
+    def _allocate(self, number_of_days, auto_allocate_new_employees):
+        self.env['hr.leave.allocation.mass.wizard'].create({
+            'holiday_status_id': self.leave_type.id,
+            'number_of_days': number_of_days,
+            'department_ids': [(6, 0, self.department.ids)],
+            'auto_allocate_new_employees': auto_allocate_new_employees,
+        }).action_allocate()
+
+    def test_rule_keeps_mass_allocated_days(self):
+        self._allocate(5, auto_allocate_new_employees=True)
+        self._allocate(3, auto_allocate_new_employees=False)
+        allocation = self.env['hr.leave.allocation'].search([
+            ('employee_id', '=', self.employee.id),
+            ('holiday_status_id', '=', self.leave_type.id),
+        ])
+        self.assertEqual(allocation.number_of_days, 8)
+        self.assertEqual(allocation.allocation_origin, 'mass')
+
+        rule = allocation.allocation_rule_id
+        self.assertTrue(rule)
+        rule._apply_to_existing_employees()
+        self.assertEqual(allocation.number_of_days, 8,
+                         "La règle ne réaligne pas les jours de l'allocation massive")
@@ -0,0 +1,60 @@
+from odoo.tests import tagged
+from odoo.tests.common import HttpCase, new_test_user
+
+
+@tagged('post_install', '-at_install')
+class TestTimeoffBalancesRoute(HttpCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Manager sans droits de gestionnaire de congés : son équipe uniquement
+        cls.manager_user = new_test_user(cls.env, login='timeoff_team_manager', groups='base.group_user')
+        cls.manager = cls.env['hr.employee'].create({
+            'name': 'Manager soldes',
+            'user_id': cls.manager_user.id,
+        })
+        cls.team = cls.env['hr.employee'].create([{
+            'name': f'Équipier soldes {index}',
+            'parent_id': cls.manager.id,
+        } for index in range(2)])
+        cls.outsider = cls.env['hr.employee'].create({'name': 'Hors équipe soldes'})
+
+    def _get_balances(self, employees, headers=None):
+        ids = ','.join(str(employee_id) for employee_id in employees.ids)
+        return self.url_open(f'/timeoff/balances?employee_ids={ids}', headers=headers)
+
+    def test_balances_scoped_to_team(self):
+        self.authenticate('timeoff_team_manager', 'timeoff_team_manager')
+        response = self._get_balances(self.manager | self.team | self.outsider)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {employee['id'] for employee in response.json()['employees']},
+            set((self.manager | self.team).ids),
+            "Un manager hors gestion des congés ne lit que lui-même et son équipe",
+        )
+
+    def test_balances_etag_revalidation(self):
+        self.authenticate('timeoff_team_manager', 'timeoff_team_manager')
+        response = self._get_balances(self.team)
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers['ETag']
+        self.assertTrue(etag)
+
+        response = self._get_balances(self.team, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(response.content)
+
+        self.env['hr.leave.allocation'].create({
+            'name': 'Allocation soldes',
+            'employee_id': self.team[0].id,
+            'holiday_status_id': self.env['hr.leave.type'].create({
+                'name': 'Congé soldes',
+                'requires_allocation': 'yes',
+                'request_unit': 'day',
+            }).id,
+            'number_of_days': 5,
+        })._approve_created_allocations()
+        response = self._get_balances(self.team, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200, "Une allocation modifiée invalide l'ETag")
+        self.assertNotEqual(response.headers['ETag'], etag)
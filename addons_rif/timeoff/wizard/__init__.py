@@ -1,2 +1,4 @@
 from . import leave_refuse_wizard
-from . import hr_leave_allocation_mass_wizard
\ No newline at end of file
+from . import hr_leave_allocation_mass_wizard
+from . import hr_leave_allocation_rule_apply_wizard
+from . import hr_leave_import_wizard
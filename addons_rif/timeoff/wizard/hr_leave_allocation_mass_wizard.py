@@ -1,5 +1,6 @@
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
+from ..models.timeoff_perf_stat import profiled
 
 class HrLeaveAllocationMassWizard(models.TransientModel):
     _name = 'hr.leave.allocation.mass.wizard'
@@ -17,14 +18,18 @@ class HrLeaveAllocationMassWizard(models.TransientModel):
         help="Si coché, les nouveaux employés ajoutés à ces départements recevront automatiquement cette allocation"
     )
 
-    def action_allocate(self):
-
+    def _check_allocation_values(self):
         if self.number_of_days <= 0:
             raise UserError(_("Le champ 'Nombre de jours' est obligatoire et doit être supérieur à 0."))
         
         if not self.department_ids:
             raise UserError(_("Veuillez sélectionner au moins un département."))
 
+    @profiled
+    def action_allocate(self):
+
+        self._check_allocation_values()
+
 
         employees = self.env['hr.employee'].search([
             ('department_id', 'in', self.department_ids.ids)
@@ -33,69 +38,67 @@ class HrLeaveAllocationMassWizard(models.TransientModel):
         if not employees:
             raise UserError(_("Aucun employé trouvé dans les départements sélectionnés."))
 
-        allocations_created = 0
-        for employee in employees:
-            
-            existing_allocation = self.env['hr.leave.allocation'].search([
-                ('employee_id', '=', employee.id),
-                ('holiday_status_id', '=', self.holiday_status_id.id),
-                ('state', 'in', ['validate', 'confirm']),
-            ], limit=1)
-            
-            if existing_allocation:
-                
-                existing_allocation.sudo().write({'number_of_days': existing_allocation.number_of_days + self.number_of_days})
-                allocations_created += 1
-            else:
-                
-                allocation_vals = {
-                    'name': f'Allocation massive - {self.holiday_status_id.name}',
-                    'employee_id': employee.id,
-                    'holiday_status_id': self.holiday_status_id.id,
-                    'number_of_days': self.number_of_days,
-                    'allocation_type': 'regular',  # Type d'allocation
-                }
-                
-                try:
-                    
-                    allocation = self.env['hr.leave.allocation'].sudo().create(allocation_vals)
-                    
-                    
-                    if hasattr(allocation, 'action_approve'):
-                        allocation.action_approve()
-                    elif hasattr(allocation, 'action_validate'):
-                        allocation.action_validate()
-                    else:
-                        
-                        allocation.write({'state': 'validate'})
-                    
-                    allocations_created += 1
-                    
-                except Exception as e:
-                    
-                    try:
-                        allocation_vals['state'] = 'validate'
-                        allocation = self.env['hr.leave.allocation'].sudo().with_context(skip_validation=True).create(allocation_vals)
-                        allocations_created += 1
-                    except Exception as e2:
-                        continue
+        rule = self._create_auto_allocation_rule() if self.auto_allocate_new_employees else None
+        results = self.env['hr.leave.allocation']._mass_allocate(
+            employees,
+            self.holiday_status_id,
+            self.number_of_days,
+            f'Allocation massive - {self.holiday_status_id.name}',
+            rule=rule,
+        )
 
-        
-        if self.auto_allocate_new_employees:
-            self._create_auto_allocation_rule()
+        return self._get_allocation_result_action(results)
+
+    def action_enqueue(self):
+        """Planifier l'allocation en arrière-plan : le job est découpé en lots traités par le cron."""
+        self._check_allocation_values()
+        rule = self._create_auto_allocation_rule() if self.auto_allocate_new_employees else None
+        job = self.env['hr.leave.allocation.mass.job'].sudo()._enqueue(
+            self.holiday_status_id,
+            self.number_of_days,
+            self.department_ids,
+            rule=rule,
+        )
+        if not job.chunk_ids:
+            raise UserError(_("Aucun employé trouvé dans les départements sélectionnés."))
+
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': 'hr.leave.allocation.mass.job',
+            'res_id': job.id,
+            'view_mode': 'form',
+            'target': 'current',
+        }
+
+    def _get_allocation_result_action(self, results):
+        """Notification résumant le résultat par employé, avec le détail des échecs."""
+        failures = {employee_id: message for employee_id, (status, message) in results.items() if status == 'failed'}
+        message = _('Allocation effectuée pour %d employé(s)') % (len(results) - len(failures))
+        if failures:
+            failed_employees = self.env['hr.employee'].browse(list(failures))
+            message += '\n' + _('Échec pour %d employé(s) :') % len(failures)
+            for employee in failed_employees[:10]:
+                message += f'\n- {employee.name} : {failures[employee.id]}'
+            if len(failures) > 10:
+                message += '\n' + _('... et %d autre(s)') % (len(failures) - 10)
 
         return {
-            'type': 'ir.actions.act_window_close',
+            'type': 'ir.actions.client',
             'tag': 'display_notification',
             'params': {
-                'title': _('Succès'),
-                'message': _('Allocation effectuée pour %d employé(s)') % allocations_created,
-                'type': 'success'
+                'title': _('Succès') if not failures else _('Allocation partielle'),
+                'message': message,
+                'type': 'success' if not failures else 'warning',
+                'sticky': bool(failures),
+                'next': {'type': 'ir.actions.act_window_close'},
             }
         }
 
     def _create_auto_allocation_rule(self):
-        """Créer une règle d'allocation automatique pour les nouveaux employés"""
+        """Créer une règle d'allocation automatique pour les nouveaux employés.
+
+        :return: la règle existante ou créée, à laquelle rattacher les allocations
+        """
         
         existing_rule = self.env['hr.leave.allocation.rule'].sudo().search([
             ('holiday_status_id', '=', self.holiday_status_id.id),
@@ -103,11 +106,12 @@ class HrLeaveAllocationMassWizard(models.TransientModel):
             ('active', '=', True)
         ], limit=1)
         
-        if not existing_rule:
-            self.env['hr.leave.allocation.rule'].sudo().create({
-                'name': f'Auto-allocation - {self.holiday_status_id.name} - {", ".join(self.department_ids.mapped("name"))}',
-                'holiday_status_id': self.holiday_status_id.id,
-                'department_ids': [(6, 0, self.department_ids.ids)],
-                'number_of_days': self.number_of_days,
-                'active': True,
-            })
+        if existing_rule:
+            return existing_rule
+        return self.env['hr.leave.allocation.rule'].sudo().create({
+            'name': f'Auto-allocation - {self.holiday_status_id.name} - {", ".join(self.department_ids.mapped("name"))}',
+            'holiday_status_id': self.holiday_status_id.id,
+            'department_ids': [(6, 0, self.department_ids.ids)],
+            'number_of_days': self.number_of_days,
+            'active': True,
+        })
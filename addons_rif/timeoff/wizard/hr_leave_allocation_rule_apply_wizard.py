@@ -0,0 +1,68 @@
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from ..models.timeoff_perf_stat import profiled
+
+class HrLeaveAllocationRuleApplyWizard(models.TransientModel):
+    _name = 'hr.leave.allocation.rule.apply.wizard'
+    _description = "Application rétroactive d'une règle d'allocation"
+
+    rule_id = fields.Many2one('hr.leave.allocation.rule', string="Règle", required=True, readonly=True)
+    line_ids = fields.One2many('hr.leave.allocation.rule.apply.wizard.line', 'wizard_id',
+                               string="Aperçu par département", readonly=True)
+    missing_count = fields.Integer(string="Allocations à créer", compute='_compute_totals')
+    mismatched_count = fields.Integer(string="Allocations à mettre à jour", compute='_compute_totals')
+
+    @api.model
+    def default_get(self, fields_list):
+        """Simulation : l'écart est calculé à l'ouverture, sans rien modifier."""
+        res = super().default_get(fields_list)
+        rule_id = res.get('rule_id') or (
+            self.env.context.get('active_model') == 'hr.leave.allocation.rule' and self.env.context.get('active_id')
+        )
+        if not rule_id:
+            return res
+        res['rule_id'] = rule_id
+        if 'line_ids' in fields_list:
+            diff = self.env['hr.leave.allocation.rule'].sudo().browse(rule_id)._get_application_diff()
+            res['line_ids'] = [(0, 0, {
+                'department_id': department_id,
+                'employee_count': values['employee_count'],
+                'missing_count': len(values['missing_employee_ids']),
+                'mismatched_count': len(values['mismatched_allocation_ids']),
+            }) for department_id, values in diff.items()]
+        return res
+
+    @api.depends('line_ids.missing_count', 'line_ids.mismatched_count')
+    def _compute_totals(self):
+        for wizard in self:
+            wizard.missing_count = sum(wizard.line_ids.mapped('missing_count'))
+            wizard.mismatched_count = sum(wizard.line_ids.mapped('mismatched_count'))
+
+    @profiled
+    def action_apply(self):
+        self.ensure_one()
+        if not self.rule_id.active:
+            raise UserError(_("La règle %s est archivée.", self.rule_id.name))
+        created, updated = self.rule_id.sudo()._apply_to_existing_employees()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Succès'),
+                'message': _('%(created)d allocation(s) créée(s), %(updated)d mise(s) à jour',
+                             created=created, updated=updated),
+                'type': 'success',
+                'next': {'type': 'ir.actions.act_window_close'},
+            }
+        }
+
+
+class HrLeaveAllocationRuleApplyWizardLine(models.TransientModel):
+    _name = 'hr.leave.allocation.rule.apply.wizard.line'
+    _description = "Ligne d'aperçu de l'application d'une règle"
+
+    wizard_id = fields.Many2one('hr.leave.allocation.rule.apply.wizard', required=True, ondelete='cascade')
+    department_id = fields.Many2one('hr.department', string="Département", readonly=True)
+    employee_count = fields.Integer(string="Employés", readonly=True)
+    missing_count = fields.Integer(string="À créer", readonly=True)
+    mismatched_count = fields.Integer(string="À mettre à jour", readonly=True)
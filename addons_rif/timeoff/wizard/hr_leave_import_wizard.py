@@ -0,0 +1,60 @@
+import base64
+import io
+import tempfile
+
+from odoo import models, fields, _
+from odoo.exceptions import UserError
+
+class HrLeaveImportWizard(models.TransientModel):
+    _name = 'hr.leave.import.wizard'
+    _description = 'Import de congés (CSV)'
+
+    data_file = fields.Binary(string="Fichier CSV", required=True, attachment=True)
+    filename = fields.Char(string="Nom du fichier")
+    delimiter = fields.Selection([
+        (',', 'Virgule'),
+        (';', 'Point-virgule'),
+    ], string="Séparateur", default=',', required=True)
+    state = fields.Selection([('draft', 'Brouillon'), ('done', 'Terminé')], default='draft')
+    imported_count = fields.Integer(string="Congés importés", readonly=True)
+    rejected_count = fields.Integer(string="Lignes rejetées", readonly=True)
+    rejected_file = fields.Binary(string="Lignes rejetées (CSV)", readonly=True, attachment=True)
+    rejected_filename = fields.Char(readonly=True)
+
+    def _open_data_file(self):
+        """Ouvrir le fichier importé en flux, depuis le filestore quand c'est possible,
+        pour ne pas charger tout le fichier en mémoire."""
+        attachment = self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name),
+            ('res_field', '=', 'data_file'),
+            ('res_id', '=', self.id),
+        ], limit=1)
+        if not attachment:
+            raise UserError(_("Veuillez sélectionner un fichier."))
+        if attachment.store_fname:
+            return open(attachment._full_path(attachment.store_fname), 'rb')
+        return io.BytesIO(attachment.raw)
+
+    def action_import(self):
+        self.ensure_one()
+        with self._open_data_file() as data, \
+                io.TextIOWrapper(data, encoding='utf-8-sig', newline='') as stream, \
+                tempfile.TemporaryFile(mode='w+', encoding='utf-8', newline='') as rejected_stream:
+            counts = self.env['hr.leave.import']._import_csv(stream, rejected_stream, delimiter=self.delimiter)
+            rejected_stream.seek(0)
+            rejected = rejected_stream.read().encode() if counts['rejected'] else False
+
+        self.write({
+            'state': 'done',
+            'imported_count': counts['imported'],
+            'rejected_count': counts['rejected'],
+            'rejected_file': rejected and base64.b64encode(rejected),
+            'rejected_filename': rejected and f'rejets_{self.filename or "import.csv"}',
+        })
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
@@ -1,17 +1,60 @@
-from odoo import models, fields
+from collections import defaultdict
+
+from odoo import models, fields, api
+from ..models.timeoff_perf_stat import profiled
 
 class LeaveRefuseWizard(models.TransientModel):
     _name = 'leave.refuse.wizard'
     _description = 'Wizard de refus de congé'
 
-    reason = fields.Text('Raison du refus', required=True, 
+    reason = fields.Text('Raison du refus', required=True,
                         help="Expliquez pourquoi cette demande est refusée...")
+    line_ids = fields.One2many('leave.refuse.wizard.line', 'wizard_id', string="Demandes à refuser")
+    leave_count = fields.Integer(compute='_compute_leave_count')
+
+    @api.model
+    def default_get(self, fields_list):
+        res = super().default_get(fields_list)
+        if 'line_ids' in fields_list and not res.get('line_ids'):
+            res['line_ids'] = [(0, 0, {'leave_id': leave_id}) for leave_id in self._get_active_leave_ids()]
+        return res
+
+    @api.depends('line_ids')
+    def _compute_leave_count(self):
+        for wizard in self:
+            wizard.leave_count = len(wizard.line_ids)
+
+    def _get_active_leave_ids(self):
+        context = self.env.context
+        if context.get('active_model', 'hr.leave') != 'hr.leave':
+            return []
+        return context.get('active_ids') or ([context['active_id']] if context.get('active_id') else [])
 
+    @profiled
     def action_refuse(self):
-        """Enregistre la raison puis déclenche le refus réel."""
-        leave = self.env['hr.leave'].browse(self.env.context.get('active_id'))
-        if leave:
-            leave.write({'refuse_reason': self.reason})
-            
-            return leave.with_context(from_refuse_wizard=True).action_refuse()
-        return {'type': 'ir.actions.act_window_close'}
\ No newline at end of file
+        """Enregistre les raisons (une écriture par raison distincte) puis déclenche le refus réel."""
+        leaves_by_reason = defaultdict(lambda: self.env['hr.leave'])
+        for line in self.line_ids:
+            leaves_by_reason[line.reason or self.reason] |= line.leave_id
+        if not leaves_by_reason:
+            leaves_by_reason[self.reason] = self.env['hr.leave'].browse(self._get_active_leave_ids())
+
+        leaves = self.env['hr.leave']
+        for reason, reason_leaves in leaves_by_reason.items():
+            reason_leaves.write({'refuse_reason': reason})
+            leaves |= reason_leaves
+        if leaves:
+            return leaves.with_context(from_refuse_wizard=True).action_refuse()
+        return {'type': 'ir.actions.act_window_close'}
+
+
+class LeaveRefuseWizardLine(models.TransientModel):
+    _name = 'leave.refuse.wizard.line'
+    _description = 'Ligne du wizard de refus de congé'
+
+    wizard_id = fields.Many2one('leave.refuse.wizard', required=True, ondelete='cascade')
+    leave_id = fields.Many2one('hr.leave', string="Demande", required=True, ondelete='cascade')
+    employee_id = fields.Many2one(related='leave_id.employee_id')
+    holiday_status_id = fields.Many2one(related='leave_id.holiday_status_id')
+    reason = fields.Text('Raison spécifique',
+                         help="Laisser vide pour utiliser la raison commune.")